@@ -0,0 +1,243 @@
+"""
+Chat Latency Benchmark
+Runs scripted conversations through handle_chat against the local Groq and
+Photon API stand-ins (simulators/) and reports per-turn latency for each
+scenario. Results can be saved and compared against a baseline, so latency
+regressions show up locally.
+
+Conversations repeat their inputs far more than production traffic does,
+so the in-process caches (pincodes, quotes, query embeddings, RAG context,
+answers) are turned off by default (BENCH_CACHE_OFF) and every timed turn
+includes its GetQuote / Groq calls; --caches keeps the app's settings.
+Each quote conversation also gets its own pincodes, so concurrent quotes
+are not coalesced into one GetQuote. The knowledge scenario uses the vector store already on disk.
+
+The untimed warm-up pass checks, through the stand-ins' /sim/stats, that
+every scenario reached the backend endpoints it is meant to time (see
+EXPECTED_ENDPOINTS), so a scenario that ends in a canned reply fails loudly.
+
+Run from the repository root:
+    python -m benchmarks.bench_chat [--iterations N] [--concurrency C] [--caches]
+    python -m benchmarks.bench_chat --save baseline.json
+    python -m benchmarks.bench_chat --compare baseline.json [--tolerance 0.2]
+With --external the simulators are not started and PHOTON_BASE_URL /
+GROQ_BASE_URL are used as set.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+def _start_server(app, host: str, port: int):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name=f"sim-{port}", daemon=True)
+    thread.start()
+    deadline = time.time() + 10
+    while not server.started:
+        if time.time() > deadline or not thread.is_alive():
+            raise RuntimeError(f"stand-in server on port {port} did not start")
+        time.sleep(0.05)
+    return server
+
+
+def start_simulators():
+    """Start both stand-ins in this process and point the app config at them."""
+    from simulators import groq_server, photon_server
+    from simulators.sim_config import GROQ_SIM_HOST, GROQ_SIM_PORT, PHOTON_SIM_HOST, PHOTON_SIM_PORT
+
+    servers = [
+        _start_server(groq_server.app, GROQ_SIM_HOST, GROQ_SIM_PORT),
+        _start_server(photon_server.app, PHOTON_SIM_HOST, PHOTON_SIM_PORT),
+    ]
+    # must be set before the app modules read their config
+    os.environ["PHOTON_BASE_URL"] = f"http://{PHOTON_SIM_HOST}:{PHOTON_SIM_PORT}"
+    os.environ["GROQ_BASE_URL"] = f"http://{GROQ_SIM_HOST}:{GROQ_SIM_PORT}"
+    os.environ["GROQ_API_KEY"] = os.environ.get("GROQ_API_KEY") or "sim"
+    os.environ["EMAIL_ID"] = os.environ.get("EMAIL_ID") or "sim.user@example.com"
+    os.environ["password"] = os.environ.get("password") or "sim"
+    return servers
+
+
+# Cache sizes set unless --caches; values already in the environment win
+BENCH_CACHE_OFF = {
+    "PHOTON_PINCODE_CACHE_MAX_ENTRIES": "0",
+    "PHOTON_QUOTE_CACHE_MAX_ENTRIES": "0",
+    "PHOTON_QUERY_EMBEDDING_CACHE_SIZE": "0",
+    "PHOTON_RAG_CONTEXT_CACHE_SIZE": "0",
+    "PHOTON_ANSWER_CACHE_SIZE": "0",
+}
+
+# Stand-in for the Groq chat-completions endpoint in the stats diff
+GROQ_COMPLETIONS = "groq:/chat/completions"
+
+# Endpoints each scenario must reach on a cold run
+EXPECTED_ENDPOINTS = {
+    "greeting": set(),
+    "quote": {"/api/Common/GetPincodeDetails", "/api/Shipping/GetQuote"},
+    "quote_direct": {"/api/Common/GetPincodeDetails", "/api/Shipping/GetQuote", GROQ_COMPLETIONS},
+    "tracking": {"/api/Business/ShipmentTracking"},
+    "print_label": {"/api/Business/ShipmentTracking"},
+    "knowledge": {GROQ_COMPLETIONS},
+}
+
+
+def build_scenarios(iteration: int = 0) -> dict[str, list[str]]:
+    """
+    Messages per scenario for one conversation. Pincodes differ per
+    iteration (any 6-digit pincode resolves on the stand-in).
+    """
+    from simulators.photon_server import synthetic_tracking_number
+
+    # first synthetic shipment of the day on the Photon stand-in
+    tracking = synthetic_tracking_number(datetime.now().strftime("%Y-%m-%d"), 1)
+    return {
+        "greeting": ["hi"],
+        # guided flow: the intent reply, then the details (rule extraction)
+        "quote": ["get a quote", f"{400001 + iteration} to {110001 + iteration} 2 kg 10x10x10"],
+        # details only: extracted by the completion's get_quote tool call
+        "quote_direct": [f"{560001 + iteration} to {600001 + iteration} 5 kg 20x15x10"],
+        "tracking": ["track my shipment", tracking],
+        "print_label": ["print label"],
+        "knowledge": ["how does the dashboard work"],
+    }
+
+
+def _get_json(url: str) -> dict:
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return json.load(response)
+
+
+def fetch_stats() -> Counter:
+    """Request counts per endpoint on both stand-ins."""
+    from simulators.sim_config import GROQ_SIM_HOST, GROQ_SIM_PORT, PHOTON_SIM_HOST, PHOTON_SIM_PORT
+
+    photon = _get_json(f"http://{PHOTON_SIM_HOST}:{PHOTON_SIM_PORT}/sim/stats")
+    groq = _get_json(f"http://{GROQ_SIM_HOST}:{GROQ_SIM_PORT}/sim/stats")
+    counts = Counter(photon.get("requests", {}))
+    counts[GROQ_COMPLETIONS] = groq.get("requests", 0)
+    return counts
+
+
+def missing_endpoints(name: str, before: Counter, after: Counter) -> set:
+    reached = {endpoint for endpoint, n in after.items() if n > before.get(endpoint, 0)}
+    return EXPECTED_ENDPOINTS.get(name, set()) - reached
+
+
+def run_conversation(handle_chat, new_session_id, messages: list[str]) -> list[float]:
+    session_id = new_session_id()
+    timings = []
+    for message in messages:
+        started = time.perf_counter()
+        handle_chat(message, session_id=session_id)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Scenarios whose p95 grew by more than tolerance over the baseline."""
+    regressions = []
+    for name, summary in results.items():
+        base = baseline.get(name)
+        if not base or not base.get("p95_ms"):
+            continue
+        change = summary["p95_ms"] / base["p95_ms"] - 1
+        marker = "REGRESSION" if change > tolerance else ""
+        print(f"{name:12s} p95 {base['p95_ms']:8.1f} -> {summary['p95_ms']:8.1f} ms  {change:+7.1%}  {marker}")
+        if marker:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=20, help="conversations per scenario")
+    parser.add_argument("--concurrency", type=int, default=4, help="conversations in flight")
+    parser.add_argument("--external", action="store_true", help="use already running backends")
+    parser.add_argument("--caches", action="store_true", help="keep the app's in-process caches")
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 increase (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    if not args.external:
+        start_simulators()
+    if not args.caches:
+        for name, value in BENCH_CACHE_OFF.items():
+            os.environ.setdefault(name, value)
+
+    # imported only now: the app reads its base URLs and cache sizes at import time
+    from core.ai_orchestrator import handle_chat
+    from core.session_store import new_session_id
+    from core.metrics import RollingTimings
+
+    # iteration 0 is the warm-up; timed conversations use 1..iterations
+    scenarios = build_scenarios()
+
+    # untimed pass: login, model load and connection setup; with the
+    # stand-ins also check each scenario reached its backend endpoints
+    check = not args.external
+    failures = []
+    for name, messages in scenarios.items():
+        before = fetch_stats() if check else None
+        run_conversation(handle_chat, new_session_id, messages)
+        if check:
+            missing = missing_endpoints(name, before, fetch_stats())
+            if missing:
+                failures.append(f"{name}: did not reach {', '.join(sorted(missing))}")
+    if failures:
+        sys.exit("scenario check failed:\n  " + "\n  ".join(failures))
+
+    timings = {name: RollingTimings(window=args.iterations * len(msgs)) for name, msgs in scenarios.items()}
+    jobs = [
+        (name, build_scenarios(i)[name])
+        for name in scenarios
+        for i in range(1, args.iterations + 1)
+    ]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = [
+            (name, pool.submit(run_conversation, handle_chat, new_session_id, messages))
+            for name, messages in jobs
+        ]
+        for name, future in futures:
+            for seconds in future.result():
+                timings[name].add(seconds)
+    wall = time.perf_counter() - started
+
+    results = {name: t.summary() for name, t in timings.items()}
+    turns = sum(summary["count"] for summary in results.values())
+    print(f"{args.iterations} conversations per scenario, concurrency {args.concurrency}")
+    for name, s in results.items():
+        print(
+            f"{name:12s} turns {s['count']:5d}  avg {s['avg_ms']:8.1f}  p50 {s['p50_ms']:8.1f}  "
+            f"p95 {s['p95_ms']:8.1f}  max {s['max_ms']:8.1f} ms"
+        )
+    print(f"{turns} turns in {wall:.2f}s ({turns / wall:.1f} turns/s)")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({
+                "config": {"iterations": args.iterations, "concurrency": args.concurrency,
+                           "caches": args.caches},
+                "scenarios": results,
+            }, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["scenarios"]
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Intent Matching Benchmark
+Compares the compiled PhraseMatcher against the previous list-scan
+implementations of detect_intent and _detect_target_source, checks that
+both agree on every message, and prints per-call timings.
+
+Run from the repository root:
+    python -m benchmarks.bench_intent [--number N]
+"""
+import argparse
+import timeit
+from core.phrase_matcher import get_intent_matcher, get_source_matcher
+
+
+# =====================================================
+# PREVIOUS IMPLEMENTATIONS (reference)
+# =====================================================
+
+def legacy_detect_intent(message):
+    msg = message.lower().strip()
+
+    info_prefixes = [
+        "how", "what", "why", "explain", "tell me about",
+        "describe", "show me how", "can you explain",
+        "what is", "what are", "how to", "how does", "how do",
+        "where", "when", "who",
+    ]
+    info_keywords = [
+        "working", "work", "process", "flow", "feature", "module",
+        "overview", "about", "mean", "meaning", "difference",
+        "generate", "pending", "without label", "not generated",
+        "history", "report", "dashboard", "spot", "analytics",
+        "example", "another example", "other example", "more example",
+    ]
+
+    is_question = any(msg.startswith(p) for p in info_prefixes)
+    has_info_word = any(w in msg for w in info_keywords)
+
+    example_phrases = ["give me example", "give me other example", "give me another example",
+                       "show me example", "another example", "other example", "more example",
+                       "different example", "one more example"]
+    if any(p in msg for p in example_phrases):
+        return None
+    if is_question and has_info_word:
+        return None
+
+    track_action_phrases = [
+        "track my", "track shipment", "track package", "track parcel",
+        "track order", "track it", "tracking status",
+        "where is my", "check status",
+    ]
+    if any(phrase in msg for phrase in track_action_phrases):
+        return "tracking"
+
+    quote_phrases = [
+        "get quote", "get a quote", "shipping quote",
+        "check rate", "get rate", "shipping rate",
+        "what will it cost to ship", "how much to ship",
+        "price for shipping", "shipping cost",
+        "quote from", "rate from",
+    ]
+    if any(phrase in msg for phrase in quote_phrases):
+        return "quote"
+    if msg in ["quote", "rate", "price", "cost"]:
+        return "quote"
+
+    ship_phrases = [
+        "create shipment", "create a shipment", "new shipment",
+        "ship a box", "ship from", "ship to",
+        "send package", "send parcel", "send a package",
+        "book shipment", "book a shipment",
+        "ship it", "start shipping",
+    ]
+    if any(phrase in msg for phrase in ship_phrases):
+        return "shipping"
+    if msg in ["ship", "shipment", "create shipment", "send", "parcel", "courier", "deliver"]:
+        return "shipping"
+
+    label_phrases = [
+        "print label", "get label", "download label",
+        "shipping label", "print my label", "label download",
+    ]
+    if any(phrase in msg for phrase in label_phrases):
+        return "print_label"
+    if msg in ["label", "print label"]:
+        return "print_label"
+
+    if msg == "help":
+        return "help"
+
+    return None
+
+
+def legacy_detect_target_source(query):
+    q = query.lower().strip()
+    source_map = [
+        (["spot rate request", "spot rate", "spot request"], "Spot Rate Request.txt"),
+        (["rate request", "rate shopping"], "Rate Request.txt"),
+        (["dashboard", "analytics dashboard", "logistics dashboard"], "Dashboard.txt"),
+        (["report module", "report", "reports"], "Report_Module.txt"),
+        (["shipment module", "ship a box", "mass shipping", "sap shipping"], "Shipment_Module.txt"),
+        (["get quote", "quote module"], "Get Quote.txt"),
+    ]
+    for phrases, source_file in source_map:
+        for phrase in phrases:
+            if phrase in q:
+                return source_file
+    return None
+
+
+# =====================================================
+# COMPILED MATCHER
+# =====================================================
+
+def compiled_detect_intent(message):
+    match = get_intent_matcher().match(message)
+    return match.value if match else None
+
+
+def compiled_detect_target_source(query):
+    match = get_source_matcher().match(query)
+    return match.name if match else None
+
+
+MESSAGES = [
+    "hi", "yes", "1", "cancel", "help", "quote", "label", "ship",
+    "Get a quote from 400001 to 110001 for 2 kg 10x10x10",
+    "how much to ship a box from Mumbai to Delhi",
+    "Track my shipment please",
+    "where is my parcel AWB123456",
+    "create a shipment to Bangalore",
+    "print label for my last shipment",
+    "What is the dashboard and how does it work?",
+    "how does spot rate request work",
+    "explain the report module",
+    "give me another example",
+    "tell me about mass shipping in sap shipping",
+    "I want to book a shipment tomorrow morning with two boxes",
+    "can you explain rate shopping",
+    "download label",
+    "what are the pending shipments without label",
+    "ship from my default warehouse to the saved address in Pune",
+    "thanks, that was helpful",
+    "My order has not arrived yet and I am getting worried about it",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--number", type=int, default=2000, help="passes over the message set")
+    args = parser.parse_args()
+
+    for message in MESSAGES:
+        assert legacy_detect_intent(message) == compiled_detect_intent(message), message
+        assert legacy_detect_target_source(message) == compiled_detect_target_source(message), message
+
+    # compile outside the timed region
+    get_intent_matcher()
+    get_source_matcher()
+
+    cases = [
+        ("detect_intent", legacy_detect_intent, compiled_detect_intent),
+        ("detect_target_source", legacy_detect_target_source, compiled_detect_target_source),
+    ]
+    calls = args.number * len(MESSAGES)
+    print(f"{len(MESSAGES)} messages x {args.number} passes")
+    for name, legacy, compiled in cases:
+        legacy_s = timeit.timeit(lambda: [legacy(m) for m in MESSAGES], number=args.number)
+        compiled_s = timeit.timeit(lambda: [compiled(m) for m in MESSAGES], number=args.number)
+        print(
+            f"{name:22s} legacy {legacy_s / calls * 1e6:7.2f} us/call   "
+            f"compiled {compiled_s / calls * 1e6:7.2f} us/call   "
+            f"speedup {legacy_s / compiled_s:5.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,25 @@
 from collections import Counter
-from datetime import datetime, timedelta
+from collections.abc import MutableMapping
+from contextvars import ContextVar
 import os
 import json
 import re
+import threading
+import time
+from types import SimpleNamespace
 from groq import Groq
 from dotenv import load_dotenv
 from services.auth_service import get_logged_user_name
 from retrieval.rag_retriever import build_context
+from retrieval.answer_cache import lookup_answer, store_answer
+from retrieval.vector_store import get_kb_version
+from core.session_store import create_session_store
+from core.phrase_matcher import get_intent_matcher
+from core.chat_config import GROQ_BASE_URL, LLM_MODEL
+from core.turn_hooks import TurnCancelled, get_turn_hooks, use_turn_hooks, with_progress
+from core.metrics import RollingTimings, RollingValues
+from core.prompt_builder import build_fallback_prompt
+from services.address_directory import SHIP_FROM, SHIP_TO
 from services.shipping_service import (
     get_quote,
     get_tracking,
@@ -16,12 +29,36 @@ from services.shipping_service import (
     save_new_shipto_address,
     get_pincode_details,
     get_all_warehouses,
-    get_recent_shipments,
+    get_shipments_in_range,
+    find_address,
     print_label
 )
 
+# Slow steps report progress to streaming clients and double as
+# cancellation checkpoints (see core/turn_hooks.py)
+get_quote = with_progress("Fetching rates from carriers...")(get_quote)
+get_tracking = with_progress("Fetching tracking details...")(get_tracking)
+get_shipments_in_range = with_progress("Looking up your recent shipments...")(get_shipments_in_range)
+create_shipment = with_progress("Creating your shipment...")(create_shipment)
+build_context = with_progress("Searching the knowledge base...")(build_context)
+
 load_dotenv()
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """
+    Groq client, created on first use so the module imports without an
+    API key (offline tools, the stand-in server in simulators/).
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = Groq(api_key=os.getenv("GROQ_API_KEY"), base_url=GROQ_BASE_URL)
+    return _client
 
 LOCATION_ICON = """
 <svg viewBox="0 0 24 24" width="16" height="16" style="vertical-align:middle;margin-right:5px">
@@ -243,15 +280,7 @@ def analyze_recent_shipments(data):
 
 def get_smart_address_suggestion():
 
-    today = datetime.now()
-    all_shipments = []
-
-    for i in range(30):
-        check_date = (today - timedelta(days=i)).strftime("%Y-%m-%d")
-        recent = get_recent_shipments(check_date)
-
-        if recent.get("statusCode") == 200 and recent.get("data"):
-            all_shipments.extend(recent.get("data"))
+    all_shipments = get_shipments_in_range(30)
 
     if not all_shipments:
         return None
@@ -274,14 +303,11 @@ def get_smart_address_suggestion():
         "to_city": Counter(to_cities).most_common(1)[0][0]
     }
 # =====================================================
-# GLOBAL CONVERSATION STATE
+# PER-SESSION CONVERSATION STATE
 # =====================================================
 
-conversation_state = {}
-
-def reset_state():
-    global conversation_state
-    conversation_state = {
+def _default_state():
+    return {
         "flow_mode": None,  # quote / shipping / tracking
 
         # Quote fields
@@ -332,7 +358,59 @@ def reset_state():
         "smart_flow": False
     }
 
-reset_state()
+
+# The state of the session whose turn is running on this thread/task.
+# Callers that do not pass a session id share one legacy default state.
+_active_state: ContextVar[dict] = ContextVar("conversation_state", default=_default_state())
+
+
+class _ConversationState(MutableMapping):
+    """Dict-like view that always resolves to the active session's state."""
+
+    def __getitem__(self, key):
+        return _active_state.get()[key]
+
+    def __setitem__(self, key, value):
+        _active_state.get()[key] = value
+
+    def __delitem__(self, key):
+        del _active_state.get()[key]
+
+    def __iter__(self):
+        return iter(_active_state.get())
+
+    def __len__(self):
+        return len(_active_state.get())
+
+    def get(self, key, default=None):
+        return _active_state.get().get(key, default)
+
+    def update(self, *args, **kwargs):
+        _active_state.get().update(*args, **kwargs)
+
+
+conversation_state = _ConversationState()
+_session_store = create_session_store(_default_state)
+
+
+def reset_state(session_id=None):
+    """
+    Reset the active session's state in place, or drop the stored state
+    of session_id when one is given. The latter waits for an in-flight
+    turn of that session, so call it off the event loop.
+    """
+    if session_id is not None:
+        _session_store.reset(session_id)
+        return
+
+    state = _active_state.get()
+    state.clear()
+    state.update(_default_state())
+
+
+def get_session_stats() -> dict:
+    return _session_store.stats()
+
 
 # =====================================================
 # SAFE NUMERIC HELPERS (IMPROVED)
@@ -352,11 +430,23 @@ def safe_float(value):
 # ADVANCED QUOTE EXTRACTION
 # =====================================================
 
+# Shared by extract_quote_fields and the LLM extraction pre-filter
+_PINCODE_RE = re.compile(r"\b\d{6}\b")
+_WEIGHT_RES = (
+    re.compile(r'(\d+(\.\d+)?)\s*kg'),
+    re.compile(r'weight\s*(\d+(\.\d+)?)'),
+)
+_DIM_RES = (
+    re.compile(r'(\d+)[x×*](\d+)[x×*](\d+)'),
+    re.compile(r'(\d+)\s+(\d+)\s+(\d+)'),
+)
+
+
 def extract_quote_fields(message):
     msg = message.lower().strip()
 
     # -------- PINCODES --------
-    pincodes = re.findall(r"\b\d{6}\b", msg)
+    pincodes = _PINCODE_RE.findall(msg)
 
     for pin in pincodes:
         if not conversation_state["from_pincode"]:
@@ -365,13 +455,8 @@ def extract_quote_fields(message):
             conversation_state["to_pincode"] = pin
 
     # -------- WEIGHT --------
-    weight_patterns = [
-        r'(\d+(\.\d+)?)\s*kg',
-        r'weight\s*(\d+(\.\d+)?)'
-    ]
-
-    for pattern in weight_patterns:
-        match = re.search(pattern, msg)
+    for pattern in _WEIGHT_RES:
+        match = pattern.search(msg)
         if match:
             conversation_state["weight"] = float(match.group(1))
             break
@@ -391,170 +476,282 @@ def extract_quote_fields(message):
                 return
 
     # -------- DIMENSIONS --------
-    dim_patterns = [
-        r'(\d+)[x×*](\d+)[x×*](\d+)',
-        r'(\d+)\s+(\d+)\s+(\d+)'
-    ]
-
-    for pattern in dim_patterns:
-        match = re.search(pattern, msg)
+    for pattern in _DIM_RES:
+        match = pattern.search(msg)
         if match:
             conversation_state["length"] = float(match.group(1))
             conversation_state["width"] = float(match.group(2))
             conversation_state["height"] = float(match.group(3))
             break
 
+def match_intent(message):
+    """
+    Intent plus the matched rule and phrase spans, e.g.
+    PhraseMatch(name="quote", value="quote", spans=(Span("contains", "get quote", 0, 9),)).
+    Informational / example questions match a rule whose value is None,
+    so they skip the action flows and go to the RAG fallback.
+    Phrase tables live in core/intent_phrases.json.
+    """
+    return get_intent_matcher().match(message)
+
+
 def detect_intent(message):
-    msg = message.lower().strip()
+    match = match_intent(message)
+    return match.value if match else None
 
-    # ---- INFORMATIONAL / KNOWLEDGE QUESTIONS → skip to RAG fallback ----
-    info_prefixes = [
-        "how", "what", "why", "explain", "tell me about",
-        "describe", "show me how", "can you explain",
-        "what is", "what are", "how to", "how does", "how do",
-        "where", "when", "who",
-    ]
-    info_keywords = [
-        "working", "work", "process", "flow", "feature", "module",
-        "overview", "about", "mean", "meaning", "difference",
-        "generate", "pending", "without label", "not generated",
-        "history", "report", "dashboard", "spot", "analytics",
-        "example", "another example", "other example", "more example",
-    ]
+# =====================================================
+# SHIPPING DETAILS PRE-FILTER
+# =====================================================
+# Shipping fields are extracted by the fallback completion's get_quote tool
+# call, which always carries the tool schemas; there is no separate
+# extraction request. The regexes only tell which turns would have needed
+# one (extraction_calls_avoided) and keep such turns out of the answer cache.
 
-    is_question = any(msg.startswith(p) for p in info_prefixes)
-    has_info_word = any(w in msg for w in info_keywords)
+_TRACKING_NO_RE = re.compile(r"\b\d{10,20}\b")
 
-    # Direct example requests should always go to RAG
-    example_phrases = ["give me example", "give me other example", "give me another example",
-                       "show me example", "another example", "other example", "more example",
-                       "different example", "one more example"]
-    is_example_request = any(p in msg for p in example_phrases)
+_prefilter_lock = threading.Lock()
+_prefilter_counts = {"extraction_calls_avoided": 0}
 
-    if is_example_request:
-        return None  # Let RAG handle it
 
-    if is_question and has_info_word:
-        return None  # Let RAG handle it
+def may_contain_shipping_details(message):
+    msg = message.lower()
+    return bool(
+        _PINCODE_RE.search(msg)
+        or any(p.search(msg) for p in _WEIGHT_RES)
+        or any(p.search(msg) for p in _DIM_RES)
+    )
 
-    # ---- ACTION INTENTS (direct commands only) ----
 
-    # tracking — direct action requests only
-    track_action_phrases = [
-        "track my", "track shipment", "track package", "track parcel",
-        "track order", "track it", "tracking status",
-        "where is my", "check status",
-    ]
-    if any(phrase in msg for phrase in track_action_phrases):
-        return "tracking"
-
-    # quote
-    quote_phrases = [
-        "get quote", "get a quote", "shipping quote",
-        "check rate", "get rate", "shipping rate",
-        "what will it cost to ship", "how much to ship",
-        "price for shipping", "shipping cost",
-        "quote from", "rate from",
-    ]
-    if any(phrase in msg for phrase in quote_phrases):
-        return "quote"
-    if msg in ["quote", "rate", "price", "cost"]:
-        return "quote"
-
-    # shipping — direct creation commands
-    ship_phrases = [
-        "create shipment", "create a shipment", "new shipment",
-        "ship a box", "ship from", "ship to",
-        "send package", "send parcel", "send a package",
-        "book shipment", "book a shipment",
-        "ship it", "start shipping",
-    ]
-    if any(phrase in msg for phrase in ship_phrases):
-        return "shipping"
-    if msg in ["ship", "shipment", "create shipment", "send", "parcel", "courier", "deliver"]:
-        return "shipping"
-
-    # label
-    label_phrases = [
-        "print label", "get label", "download label",
-        "shipping label", "print my label", "label download",
-    ]
-    if any(phrase in msg for phrase in label_phrases):
-        return "print_label"
-    if msg in ["label", "print label"]:
-        return "print_label"
+def _count_prefilter(key):
+    with _prefilter_lock:
+        _prefilter_counts[key] += 1
 
-    if msg == "help":
-        return "help"
 
-    return None
+def get_llm_prefilter_stats() -> dict:
+    with _prefilter_lock:
+        return dict(_prefilter_counts)
 
-# =====================================================
-# LLM SHIPPING FIELD EXTRACTION
-# =====================================================
 
-def llm_extract_shipping_details(message):
+QUOTE_FIELDS = ["from_pincode", "to_pincode", "weight", "length", "width", "height"]
 
-    prompt = f"""
-Extract shipping details from the message.
 
-Return JSON only.
+def _continue_quote_flow():
+    """Ask for missing quote fields, or fetch and format the quote."""
+    missing = [f for f in QUOTE_FIELDS if not conversation_state.get(f)]
 
-Fields:
-from_pincode
-to_pincode
-weight
-length
-width
-height
+    if missing:
 
-Message:
-{message}
-"""
+        readable = {
+            "from_pincode": "From Pincode",
+            "to_pincode": "To Pincode",
+            "weight": "Weight (kg)",
+            "length": "Length (cm)",
+            "width": "Width (cm)",
+            "height": "Height (cm)"
+        }
 
-    response = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        temperature=0,
-        messages=[
-            {"role": "system", "content": "Extract logistics data from the user message."},
-            {"role": "user", "content": prompt}
-        ]
+        missing_readable = [readable[m] for m in missing]
+
+        return {
+            "response": "<b>Please provide:</b>\n" + "\n".join(missing_readable)
+        }
+
+    #  All fields available → call API
+    result = get_quote(
+        conversation_state["from_pincode"],
+        conversation_state["to_pincode"],
+        conversation_state["weight"],
+        conversation_state["length"],
+        conversation_state["width"],
+        conversation_state["height"]
     )
 
-    try:
-        return json.loads(response.choices[0].message.content)
-    except:
-        return {}
+    response = format_quote(result)
+
+    # stop quote loop
+    conversation_state["flow_mode"] = None
+
+    # add confirmation buttons
+    response["options"].append({
+    "label": "Yes, Create Shipment",
+    "value": "start_shipping"
+    })
+
+    response["options"].append({
+    "label": "No",
+    "value": "cancel_shipping"
+    })
+
+    return response
+
+
+def _apply_quote_tool_args(args):
+    """
+    Store the fields from a get_quote tool call (complete or partial) and
+    continue the quote flow from there.
+    """
+    if conversation_state["flow_mode"] != "quote":
+        # a new quote: do not complete it with fields left from an older one
+        for key in QUOTE_FIELDS:
+            conversation_state[key] = None
+
+    for key in ("from_pincode", "to_pincode"):
+        if args.get(key) in [None, "", 0]:
+            continue
+        if not re.match(r"^\d{6}$", str(args[key])):
+            label = "from" if key == "from_pincode" else "to"
+            return {"response": f"Invalid {label} pincode. It must be 6 digits."}
+        conversation_state[key] = str(args[key])
+
+    for key in ("weight", "length", "width", "height"):
+        value = safe_float(args.get(key))
+        if value and value > 0:
+            conversation_state[key] = value
+
+    conversation_state["flow_mode"] = "quote"
+    return _continue_quote_flow()
 
 # =====================================================
 # MAIN HANDLER
 # =====================================================
 
-def handle_chat(user_message):
-    try:
-        user_message = user_message.strip()
-        msg = user_message.lower()
-        intent = detect_intent(msg)
+def handle_chat(user_message, session_id=None, hooks=None):
+    """
+    Run one chat turn. With a session_id the turn reads and writes that
+    session's state; without one it uses the shared default state.
+    hooks (core.turn_hooks.TurnHooks) stream tokens / progress out of the
+    turn and carry cancellation in; TurnCancelled propagates to the caller.
+    """
+    with use_turn_hooks(hooks):
+        if session_id is None:
+            return _handle_turn(user_message)
+
+        with _session_store.session(session_id) as state:
+            token = _active_state.set(state)
+            try:
+                return _handle_turn(user_message)
+            finally:
+                _active_state.reset(token)
+
+
+# =====================================================
+# LLM COMPLETION
+# =====================================================
+
+_llm_timings = {
+    "time_to_first_token": RollingTimings(),
+    "completion": RollingTimings(),
+}
+_prompt_tokens = {
+    "system": RollingValues(),
+    "context": RollingValues(),
+    "tools": RollingValues(),
+    "total": RollingValues(),
+}
+_llm_timings_lock = threading.Lock()
 
-        # ================= LLM PARSER =================
 
-        if intent is None:
+def _record_llm_timing(name, seconds):
+    with _llm_timings_lock:
+        _llm_timings[name].add(seconds)
 
-            extracted = llm_extract_shipping_details(user_message)
 
-            if extracted:
+def _record_prompt_tokens(tokens):
+    """Estimated prompt size of one fallback turn, by segment."""
+    with _llm_timings_lock:
+        for name, values in _prompt_tokens.items():
+            values.add(tokens[name])
 
-                conversation_state.update({
-                    "from_pincode": extracted.get("from_pincode"),
-                    "to_pincode": extracted.get("to_pincode"),
-                    "weight": extracted.get("weight"),
-                    "length": extracted.get("length"),
-                    "width": extracted.get("width"),
-                    "height": extracted.get("height")
-                })
+    hooks = get_turn_hooks()
+    if hooks is not None:
+        hooks.metadata["prompt_tokens"] = tokens
+
+
+def get_llm_stats() -> dict:
+    with _llm_timings_lock:
+        stats = {name: timings.summary() for name, timings in _llm_timings.items()}
+        stats["prompt_tokens"] = {name: values.summary() for name, values in _prompt_tokens.items()}
+        return stats
+
+
+def _fallback_completion(messages, completion_args):
+    """
+    Run the fallback completion and return a message with .content and
+    .tool_calls. When the turn has a token hook (streaming transports) the
+    completion is streamed: content deltas are forwarded as they arrive,
+    tool-call deltas are accumulated, and cancellation is checked between
+    chunks.
+    """
+    hooks = get_turn_hooks()
+    started = time.perf_counter()
 
-                if extracted.get("from_pincode") and extracted.get("to_pincode"):
-                    conversation_state["flow_mode"] = "quote"
+    if hooks is None or hooks.on_token is None:
+        response = get_llm_client().chat.completions.create(
+            model=LLM_MODEL,
+            temperature=0,
+            messages=messages,
+            **completion_args,
+        )
+        _record_llm_timing("completion", time.perf_counter() - started)
+        return response.choices[0].message
+
+    stream = get_llm_client().chat.completions.create(
+        model=LLM_MODEL,
+        temperature=0,
+        messages=messages,
+        stream=True,
+        **completion_args,
+    )
+
+    content = []
+    tool_calls = {}  # index -> {"name", "arguments"}
+    try:
+        for chunk in stream:
+            hooks.raise_if_cancelled()
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+
+            if delta.content:
+                if not content:
+                    ttft = time.perf_counter() - started
+                    _record_llm_timing("time_to_first_token", ttft)
+                    hooks.metadata["ttft_ms"] = round(ttft * 1000, 1)
+                content.append(delta.content)
+                hooks.on_token(delta.content)
+
+            for call in delta.tool_calls or ():
+                entry = tool_calls.setdefault(call.index, {"name": "", "arguments": ""})
+                if call.function is not None:
+                    entry["name"] += call.function.name or ""
+                    entry["arguments"] += call.function.arguments or ""
+    finally:
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+
+    _record_llm_timing("completion", time.perf_counter() - started)
+    hooks.metadata["streamed"] = bool(content)
+
+    return SimpleNamespace(
+        content="".join(content),
+        tool_calls=[
+            SimpleNamespace(function=SimpleNamespace(**entry))
+            for _, entry in sorted(tool_calls.items())
+        ],
+    )
+
+
+def _handle_turn(user_message):
+    try:
+        user_message = user_message.strip()
+        msg = user_message.lower()
+        intent = detect_intent(msg)
+
+        if intent is None and may_contain_shipping_details(msg):
+            # a separate LLM extraction call used to run here; the shipping
+            # fields now come from the fallback completion's tool call
+            _count_prefilter("extraction_calls_avoided")
 
         user_name = get_logged_user_name() or "there"
 
@@ -678,19 +875,12 @@ def handle_chat(user_message):
             reset_state()
             conversation_state["flow_mode"] = "print_label"
 
-            today = datetime.now()
-            shipments = []
-
-            for i in range(7):
-                check_date = (today - timedelta(days=i)).strftime("%Y-%m-%d")
-                recent = get_recent_shipments(check_date)
-
-                if recent.get("statusCode") == 200 and recent.get("data"):
-                    shipments.extend(recent.get("data"))
+            # only the first 5 are offered, so stop scanning once they are in
+            shipments = get_shipments_in_range(7, limit=5)
 
             options = []
 
-            for s in shipments[:5]:
+            for s in shipments:
                 tracking = s.get("trackingNo") or s.get("trackingNumber")
 
                 if tracking:
@@ -800,61 +990,7 @@ def handle_chat(user_message):
 
             extract_quote_fields(user_message)
 
-            required_fields = [
-                "from_pincode",
-                "to_pincode",
-                "weight",
-                "length",
-                "width",
-                "height"
-            ]
-
-            missing = [f for f in required_fields if not conversation_state.get(f)]
-
-            if missing:
-
-                readable = {
-                    "from_pincode": "From Pincode",
-                    "to_pincode": "To Pincode",
-                    "weight": "Weight (kg)",
-                    "length": "Length (cm)",
-                    "width": "Width (cm)",
-                    "height": "Height (cm)"
-                }
-
-                missing_readable = [readable[m] for m in missing]
-
-                return {
-                    "response": "<b>Please provide:</b>\n" + "\n".join(missing_readable)
-                }
-
-                #  All fields available → call API
-            result = get_quote(
-                conversation_state["from_pincode"],
-                conversation_state["to_pincode"],
-                conversation_state["weight"],
-                conversation_state["length"],
-                conversation_state["width"],
-                conversation_state["height"]
-            )
-
-            response = format_quote(result)
-
-            # stop quote loop
-            conversation_state["flow_mode"] = None
-
-            # add confirmation buttons
-            response["options"].append({
-            "label": "Yes, Create Shipment",
-            "value": "start_shipping"
-            })
-
-            response["options"].append({
-            "label": "No",
-            "value": "cancel_shipping"
-            })
-
-            return response
+            return _continue_quote_flow()
         
         # ================= START SHIPPING FROM QUOTE =================
         if user_message == "start_shipping":
@@ -886,15 +1022,7 @@ def handle_chat(user_message):
             reset_state()
             conversation_state["flow_mode"] = "shipping"
 
-            today = datetime.now()
-            all_shipments = []
-
-            for i in range(7):  # last 7 days
-                check_date = (today -   timedelta(days=i)).strftime("%Y-%m-%d")
-                recent = get_recent_shipments(check_date)
-
-                if recent.get("statusCode") == 200 and recent.get("data"):
-                    all_shipments.extend(recent.get("data"))
+            all_shipments = get_shipments_in_range(7)  # last 7 days
 
             if all_shipments:
                 # 🔥 AI ANALYSIS LAYER  
@@ -1131,20 +1259,12 @@ def handle_chat(user_message):
             warehouses = get_all_warehouses()
             conversation_state["available_warehouses"] = warehouses
 
-            conversation_state["warehouse"] = None
-            for w in warehouses:
-                if str(w.get("city","")).lower() == str(analysis["from_city"]).lower():
-                    conversation_state["warehouse"] = w
-                    break
+            conversation_state["warehouse"] = find_address(SHIP_FROM, city=analysis["from_city"])
 
             shipto_list = get_all_shipto_addresses()
             conversation_state["available_shipto"] = shipto_list
 
-            conversation_state["shipto"] = None
-            for s in shipto_list:
-                if str(s.get("city","")).lower() == str(analysis["to_city"]).lower():
-                    conversation_state["shipto"] = s
-                    break
+            conversation_state["shipto"] = find_address(SHIP_TO, city=analysis["to_city"])
 
             if not conversation_state["warehouse"] or not conversation_state["shipto"]:
 
@@ -1246,18 +1366,16 @@ def handle_chat(user_message):
             conversation_state["available_warehouses"] = warehouses
 
             # Try auto-match warehouse
-            for w in warehouses:
-                if w.get("city") == past.get("cityFrom"):
-                    conversation_state["warehouse"] = w
-                    break
+            warehouse = find_address(SHIP_FROM, city=past.get("cityFrom"))
+            if warehouse:
+                conversation_state["warehouse"] = warehouse
 
             shipto_list = get_all_shipto_addresses()
             conversation_state["available_shipto"] = shipto_list
 
-            for s in shipto_list:
-                if s.get("city") == past.get("shipToCityName"):
-                    conversation_state["shipto"] = s
-                    break
+            shipto = find_address(SHIP_TO, city=past.get("shipToCityName"))
+            if shipto:
+                conversation_state["shipto"] = shipto
 
             # If auto-match failed → fallback manual
             if not conversation_state["warehouse"] or not conversation_state["shipto"]:
@@ -1313,21 +1431,11 @@ def handle_chat(user_message):
             # -----------------------------
             warehouses = get_all_warehouses()
             conversation_state["available_warehouses"] = warehouses
-            conversation_state["warehouse"] = None
-
-            for w in warehouses:
-                if str(w.get("city", "")).strip().lower() == str(past.get("cityFrom", "")).strip().lower():
-                    conversation_state["warehouse"] = w
-                    break
+            conversation_state["warehouse"] = find_address(SHIP_FROM, city=past.get("cityFrom"))
 
             shipto_list = get_all_shipto_addresses()
             conversation_state["available_shipto"] = shipto_list
-            conversation_state["shipto"] = None
-
-            for s in shipto_list:
-                if str(s.get("city", "")).strip().lower() == str(past.get("shipToCityName", "")).strip().lower():
-                    conversation_state["shipto"] = s
-                    break
+            conversation_state["shipto"] = find_address(SHIP_TO, city=past.get("shipToCityName"))
 
             if not conversation_state["warehouse"] or not conversation_state["shipto"]:
                 return {"response": "Unable to auto-match warehouse or ShipTo. Please select manually."}
@@ -1432,18 +1540,13 @@ def handle_chat(user_message):
             if not suggestion:
                 return {"response": "No smart address suggestion available."}
 
-            warehouses = get_all_warehouses()
-            shipto = get_all_shipto_addresses()
-
-            for w in warehouses:
-                if str(w.get("city","")).lower() == str(suggestion["from_city"]).lower():
-                    conversation_state["warehouse"] = w
-                    break
+            warehouse = find_address(SHIP_FROM, city=suggestion["from_city"])
+            if warehouse:
+                conversation_state["warehouse"] = warehouse
 
-            for s in shipto:
-                if str(s.get("city","")).lower() == str(suggestion["to_city"]).lower():
-                    conversation_state["shipto"] = s
-                    break
+            shipto = find_address(SHIP_TO, city=suggestion["to_city"])
+            if shipto:
+                conversation_state["shipto"] = shipto
 
             if conversation_state["warehouse"] and conversation_state["shipto"]:
                 return {
@@ -1574,7 +1677,7 @@ def handle_chat(user_message):
                     return {"response": "<b>Failed to save address.</b>"}
 
                 conversation_state["new_address_mode"] = False
-                conversation_state["shipto"] = get_all_shipto_addresses()[-1]
+                conversation_state["shipto"] = save_result["saved_address"]
 
                 return {"response": "<b>Address saved. Enter Product Name:</b>"}
 
@@ -1819,351 +1922,35 @@ def handle_chat(user_message):
 
         # AI RESPONSE GENERATION WITH TOOL CALLS
 
-        SYSTEM_PROMPT = f"""
-You are Photon AI Assistant developed by AvocadoLabs India Pvt Ltd.
-
-The logged-in user's name is: {user_name if user_name else "User"}.
-
-========================================
-CORE ROLE
-========================================
-
-You are STRICTLY a Photon Platform Assistant. You ONLY answer questions about:
-
-1. Shipping Quotes (get quote, compare rates)
-2. Creating Shipments (create shipment flow)
-3. Shipment Tracking (track packages)
-4. Print/Get Labels
-5. Photon platform features and modules ONLY — dashboard, rate request, spot rate request, shipment module, report module, get quote module, warehouse management, address management
-
-STRICT OFF-TOPIC REJECTION:
-You must REJECT any question that is NOT directly about the Photon platform or its shipping operations.
-
-REJECT these types of questions with the rejection message below:
-- General knowledge: "who is prime minister", "capital of India", "states in India", "India is a country"
-- Geography/history/politics/science/math/sports/entertainment
-- Any factual question about the real world that is not about Photon software
-- Coding questions, recipes, poems, stories, jokes
-- Even if the question mentions "shipping", "logistics", "India", "pincode" in a general educational context — STILL REJECT if it is not about using the Photon platform specifically
-
-ACCEPT these types of questions:
-- "how does rate request work" → YES (Photon module)
-- "what is photon dashboard" → YES (Photon module)
-- "how to create a shipment" → YES (Photon feature)
-- "explain spot rate request flow" → YES (Photon module)
-- "how to track my package" → YES (Photon feature)
-- "what is report module" → YES (Photon module)
-
-Rejection response (use this EXACT text for ALL off-topic questions):
-"I can only assist with <b>Photon platform features, shipping quotes, shipment creation, and tracking.</b> Please ask me about a Photon module or shipping operation."
-
-KNOWLEDGE BASE RULE:
-If KNOWLEDGE BASE CONTEXT is provided below, use it to answer — but ONLY if the context is about a Photon platform feature. If the user's question is general knowledge and the retrieved context is irrelevant or loosely matched, still REJECT the question.
-
-Do NOT stretch, infer, or creatively connect general topics to logistics. If it's not explicitly about using the Photon platform, reject it.
-
-========================================
-PERSONALITY & TONE
-========================================
-
-- Friendly but professional
-- Clear and structured
-- Not robotic
-- Do NOT repeat long instruction lists
-- Ask only what is missing
-
-========================================
-RESPONSE FORMATTING (MANDATORY)
-========================================
-
-For knowledge-base questions, you MUST reply using ONLY styled HTML. Do NOT output any plain text, labels, or template names. Your entire response must be valid HTML that renders visually in a chat widget.
-
-DO NOT output words like "COMPONENT LIBRARY", "TITLE HEADER", "OVERVIEW BOX", "SECTION HEADER", "STEP BOX", "FIELD LIST", "EXAMPLE BOX", "KEY POINTS BOX" — these are internal names, NEVER include them in your output.
-
-Here is the HTML structure template to follow. You MUST replace ALL placeholder content (TOPIC_TITLE, OVERVIEW_TEXT, steps, fields, examples, key points) with the ACTUAL data from the knowledge base context for the topic the user is asking about. NEVER reuse the sample values shown here — always derive content from the retrieved context.
-
-<div style="background:linear-gradient(135deg,#1a3a4a,#2f6f6f);color:#fff;padding:14px 18px;border-radius:10px 10px 0 0;margin-bottom:0"><b><svg viewBox='0 0 24 24' width='16' height='16' fill='none' stroke='currentColor' stroke-width='2' style='vertical-align:middle;margin-right:5px'><path d='M3 7l9-4 9 4-9 4-9-4z'/><path d='M3 7v10l9 4 9-4V7'/></svg> [TOPIC_TITLE]</b></div><div style="background:#f0fafa;padding:12px 16px;border-radius:0 0 10px 10px;border:1px solid #d0e8e8;border-top:0;margin-bottom:14px">[OVERVIEW_TEXT from knowledge base]</div><div style="margin:16px 0 8px 0"><b><svg viewBox='0 0 24 24' width='16' height='16' fill='none' stroke='currentColor' stroke-width='2' style='vertical-align:middle;margin-right:5px'><path d='M21 2v6h-6'/><path d='M3 12a9 9 0 0 1 15-6.7L21 8'/><path d='M3 22v-6h6'/><path d='M21 12a9 9 0 0 1-15 6.7L3 16'/></svg> How It Works</b></div><div style="background:#f7fbfb;border-left:4px solid #2f6f6f;padding:10px 14px;margin:6px 0;border-radius:0 8px 8px 0"><b>Step 1: [Step title from context]</b><br>[Step description from context]</div><div style="background:#f7fbfb;border-left:4px solid #2f6f6f;padding:10px 14px;margin:6px 0;border-radius:0 8px 8px 0"><b>Step 2: [Step title from context]</b><br>[Step description from context]</div><div style="background:#fafbfc;border:1px solid #e8ecef;padding:12px 16px;margin:8px 0;border-radius:8px"><b><svg viewBox='0 0 24 24' width='16' height='16' fill='none' stroke='currentColor' stroke-width='2' style='vertical-align:middle;margin-right:5px'><rect x='8' y='2' width='8' height='4' rx='1'/><path d='M16 4h2a2 2 0 0 1 2 2v14a2 2 0 0 1-2 2H6a2 2 0 0 1-2-2V6a2 2 0 0 1 2-2h2'/></svg> Required Fields:</b><br><br>• <b>[Field 1]:</b> [Description from context]<br>• <b>[Field 2]:</b> [Description from context]<br></div><div style="background:#f8f9fa;border:1px solid #d0d7de;padding:12px 16px;margin:10px 0;border-radius:8px"><b><svg viewBox='0 0 24 24' width='16' height='16' fill='none' stroke='currentColor' stroke-width='2' style='vertical-align:middle;margin-right:5px'><path d='M12 2a7 7 0 0 0-7 7c0 5.25 7 13 7 13s7-7.75 7-13a7 7 0 0 0-7-7z'/><circle cx='12' cy='9' r='2.5'/></svg> Example:</b><br><br>• [Real example from knowledge base context]<br>• [Another real example from knowledge base context]<br></div><div style="background:#fff8e1;border-left:4px solid #f9a825;padding:10px 14px;margin:10px 0;border-radius:0 8px 8px 0"><b><svg viewBox='0 0 24 24' width='16' height='16' fill='none' stroke='currentColor' stroke-width='2' style='vertical-align:middle;margin-right:5px'><path d='M9 18h6'/><path d='M10 22h4'/><path d='M12 2a7 7 0 0 0-4 12.7V17h8v-2.3A7 7 0 0 0 12 2z'/></svg> Key Points:</b><br><br>• [Key point 1 from context]<br>• [Key point 2 from context]<br></div>
-
-CRITICAL: The Required Fields, Examples, and Key Points sections MUST contain data specific to the topic being asked about. Extract all field names, example values, and key points directly from the knowledge base context provided. For instance:
-- If the user asks about Dashboard → show dashboard filters, analytics components, and chart types as examples.
-- If the user asks about Reports → show report types, filters, and tracking fields as examples.
-- If the user asks about Shipment Module → show shipping methods, address fields, and carrier options as examples.
-- If the user asks about Spot Rate Request → show spot rate fields, negotiation details, and status examples.
-- NEVER show Rate Request examples (like Order ID: OD_NEW-1 or carrier pricing) when the user asks about a different module.
-
-RULES — follow every single one:
-- Start EVERY response with the gradient title div (dark teal background, white text) using the ACTUAL topic title.
-- Immediately follow with the overview div (light teal background, no gap from title) using the ACTUAL topic overview.
-- Use a section header div with bold + inline SVG icon before each group of steps.
-- Wrap EACH step in its own individual step div (light background, left green border).
-- Wrap field lists in the field div (light gray background, border) — fields MUST come from the knowledge base for the specific topic.
-- Wrap examples in the example div (gray background, gray border) — examples MUST come from the knowledge base for the specific topic.
-- End with the key points div (yellow background, left yellow border) — key points MUST be specific to the topic being discussed.
-- When comparing two things, use side-by-side flex divs.
-- NEVER output plain text outside of HTML divs.
-- NEVER output template labels or component names.
-- NEVER reuse hardcoded Rate Request examples (Order ID: OD_NEW-1, carrier pricing) for other modules.
-- ALWAYS use <b> for field names and emphasis.
-- Use <br> for line breaks, • for bullets.
-- Include ALL steps for flows — never skip or summarize.
-- Include at least one example box with real values FROM THE KNOWLEDGE BASE CONTEXT for the current topic.
-- For warnings use: <div style="background:#fff3e0;border-left:4px solid #ff9800;padding:10px 14px;margin:10px 0;border-radius:0 8px 8px 0"><b><svg viewBox='0 0 24 24' width='16' height='16' fill='none' stroke='currentColor' stroke-width='2' style='vertical-align:middle;margin-right:5px'><path d='M10.29 3.86L1.82 18a2 2 0 0 0 1.71 3h16.94a2 2 0 0 0 1.71-3L13.71 3.86a2 2 0 0 0-3.42 0z'/><line x1='12' y1='9' x2='12' y2='13'/><line x1='12' y1='17' x2='12.01' y2='17'/></svg> Note:</b> text</div>
-
-========================================
-INTENT UNDERSTANDING
-========================================
-
-You must understand natural language.
-
-Examples of valid shipping requests:
-
-- "I want to ship from 302021 to 302028 weight 5kg 5 5 5"
-- "Ship 5kg parcel Jaipur to Delhi 5x5x5"
-- "Quote from 302021 to 110001 2kg 10 10 10"
-- "Send package from 302021"
-
-You must extract:
-
-- from_pincode (6 digit Indian code)
-- to_pincode (6 digit Indian code)
-- weight (kg)
-- length (cm)
-- width (cm)
-- height (cm)
-
-If user provides partial data:
-Ask ONLY for missing fields.
-
-Example:
-User: "Ship from 302021 to 302028"
-You: "Please provide weight and dimensions (L x W x H in cm)."
-
-Do NOT restate everything again.
-
-========================================
-STRICT VALIDATION RULES
-========================================
-
-- Pincode must be exactly 6 digits.
-- Weight must be numeric.
-- Dimensions must be numeric.
-- Do NOT guess values.
-- Do NOT auto-fill missing data.
-- Do NOT fabricate courier names.
-- Do NOT fabricate prices.
-- Do NOT invent tracking numbers.
-- Never hallucinate.
+        # one completion both answers and extracts: tool arguments carry
+        # the shipping fields straight into conversation_state
+        has_shipping_details = bool(may_contain_shipping_details(msg) or _TRACKING_NO_RE.search(msg))
 
-If user confirms "yes":
-Do NOT reset conversation.
-Continue with previous context.
-
-========================================
-SHIPPING QUOTE BEHAVIOR
-========================================
-
-When ALL fields are available:
-Call get_quote function.
-
-When quote results are returned:
-Format clearly:
-
-Use these inline SVG icons when formatting quote results:
-- Location icon (for From/To): <svg viewBox='0 0 24 24' width='16' height='16' style='vertical-align:middle;margin-right:5px'><path d='M12 21s7-5.5 7-11a7 7 0 1 0-14 0c0 5.5 7 11 7 11z'/><circle cx='12' cy='10' r='2.5'/></svg>
-- Weight icon: <svg viewBox='0 0 24 24' width='16' height='16' style='vertical-align:middle;margin-right:5px'><path d='M6 9h12l-1 10H7L6 9z'/><path d='M9 9a3 3 0 0 1 6 0'/></svg>
-- Dimensions icon: <svg viewBox='0 0 24 24' width='16' height='16' style='vertical-align:middle;margin-right:5px'><path d='M3 7h18M3 17h18'/><path d='M6 7v10M18 7v10'/></svg>
-- Box icon (for Available options): <svg viewBox='0 0 24 24' width='16' height='16' style='vertical-align:middle;margin-right:5px'><path d='M3 7l9-4 9 4-9 4-9-4z'/><path d='M3 7v10l9 4 9-4V7'/></svg>
-- Money icon (for Price): <svg viewBox='0 0 24 24' width='16' height='16' style='vertical-align:middle;margin-right:5px'><circle cx='12' cy='12' r='9'/><path d='M9 12h6'/><path d='M12 9v6'/></svg>
-- Calendar icon (for dates): <svg viewBox='0 0 24 24' width='16' height='16' style='vertical-align:middle;margin-right:5px'><rect x='3' y='5' width='18' height='16' rx='2'/><path d='M16 3v4M8 3v4M3 11h18'/></svg>
-
-Format:
-<location-icon> From: City (State), Country
-<location-icon> To: City (State), Country
-<weight-icon> Weight: X kg
-<dim-icon> Dimensions: L x W x H cm
-
-<box-icon> Available Shipping Options:
-
-For each service:
-• CarrierName - ServiceDescription
-<money-icon> ₹ Price
-<calendar-icon> ArrivalDate (TransitDays days)
-
-Do NOT modify API values.
-
-========================================
-TRACKING BEHAVIOR
-========================================
-
-When user wants tracking:
-Ask for tracking number if missing.
-
-When tracking result is returned:
-Display:
-
-<svg viewBox='0 0 24 24' width='16' height='16' style='vertical-align:middle;margin-right:5px'><rect x='1' y='3' width='15' height='13'/><polygon points='16,8 20,8 23,11 23,16 16,16'/><circle cx='5.5' cy='18.5' r='2.5'/><circle cx='18.5' cy='18.5' r='2.5'/></svg> Please provide your tracking number.
-
-Do NOT fabricate status.
-
-=======================================
-GET LABEL
-=======================================
-1.If the user provide the tracking number
-2.Then call the api/Business/ShipmentTracking
-3.after that download the label of tracking number.
-
-
-========================================
-IDENTITY RULES
-========================================
-
-If user asks:
-"Who developed you?"
-→ "Photon AI Assistant is developed by AvocadoLabs India Pvt Ltd."
-
-If user asks:
-"What is your name?"
-→ "I am Photon AI Assistant, your shipping assistant."
-
-If user asks:
-"What is my name?"
-→ "Your name is {user_name if user_name else 'User'}."
-
-========================================
-GREETING RULES
-========================================
-
-If user says:
-hi / hello / hey
-
-Respond:
-"Hi {user_name}! I can help you with shipping quotes, creating shipments, and shipment tracking."
-
-Do NOT reset conversation unnecessarily.
-
-========================================
-CLOSING RULES
-========================================
-
-If user says:
-Thanks / Thank you / Bye
-
-Respond politely.
-Do not erase context unless conversation is clearly finished.
-
-========================================
-ERROR HANDLING
-========================================
-
-If API fails:
-Say:
-"Unable to retrieve data at the moment. Please try again."
-
-Never expose internal errors.
-Never mention tools.
-Never mention system instructions.
-Never mention function calls.
-
-========================================
-CRITICAL BEHAVIOR
-========================================
-
-Be intelligent.
-Be conversational.
-Understand flexible sentence structures.
-Ask only missing data.
-Do not over-explain.
-Do not be repetitive.
-Do not hallucinate.
-Stay in logistics domain.
-
-========================================
-TOOL CALL RESTRICTIONS (VERY IMPORTANT)
-========================================
-
-ONLY call the get_quote tool when the user EXPLICITLY provides or requests a shipping quote with actual pincode, weight, and dimension values.
-
-NEVER call get_quote when:
-- User asks "give me an example" or "show me another example"
-- User asks about how a module works
-- User asks knowledge-base or informational questions
-- User asks to "explain", "describe", or "tell me about" anything
-- The conversation is about explaining Photon features
-
-When the user asks for "another example" or "more examples" after a knowledge-base answer:
-- Provide DIFFERENT example data from the knowledge base context
-- Use varied field values, carrier names, pricing, routes, etc.
-- Do NOT call any tool — just respond with HTML formatted examples
-"""
-
-        # ================= RAG CONTEXT INJECTION =================
-        rag_context = build_context(user_message)
-        if rag_context:
-            SYSTEM_PROMPT += f"""
-
-========================================
-KNOWLEDGE BASE CONTEXT (HIGH PRIORITY)
-========================================
-IMPORTANT: The following context was retrieved from the Photon company knowledge base.
-You MUST use this context to answer the user's question.
-Do NOT say "I can only assist with..." when this context is relevant.
-Base your answer primarily on this context.
-Structure the answer with proper HTML formatting (<b>, <br>, bullet points).
-Be detailed and accurate. Organize information clearly with headings and steps.
-
-CRITICAL: Each chunk below is labeled with its DOCUMENT source name.
-Pay close attention to which DOCUMENT each chunk comes from.
-If the user asks about "Rate Request", answer ONLY from chunks labeled "DOCUMENT: Rate Request".
-If the user asks about "Spot Rate Request", answer ONLY from chunks labeled "DOCUMENT: Spot Rate Request".
-Do NOT mix up content from different documents. They describe DIFFERENT features.
-
-{rag_context}
-"""
-
-        response = client.chat.completions.create(
-            model="llama-3.1-8b-instant",
-            temperature=0,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": user_message}
-            ],
-            tools=[
-                {
-                    "type": "function",
-                    "function": {
-                        "name": "get_quote",
-                        "description": "Get shipping quote when all required fields are available.",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "from_pincode": {"type": "string"},
-                                "to_pincode": {"type": "string"},
-                                "weight": {"type": "number"},
-                                "length": {"type": "number"},
-                                "width": {"type": "number"},
-                                "height": {"type": "number"}
-                            }
-                        }
-                    }
-                },
-                {
-                    "type": "function",
-                    "function": {
-                        "name": "get_tracking",
-                        "description": "Track shipment using tracking number.",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "tracking_number": {"type": "string"}
-                            }
-                        }
-                    }
-                }
-            ],
-            tool_choice="auto",
+        # ================= SEMANTIC ANSWER CACHE =================
+        # only plain knowledge-base answers are reused; "another example"
+        # must produce a different answer every time
+        intent_match = match_intent(msg)
+        answer_cacheable = not has_shipping_details and not (
+            intent_match and intent_match.name == "example_request"
         )
+        answer_scope = user_name or ""
+        kb_version = get_kb_version()
+        if answer_cacheable:
+            cached = lookup_answer(user_message, answer_scope)
+            if cached is not None:
+                hooks = get_turn_hooks()
+                if hooks is not None:
+                    hooks.metadata["answer_cache"] = "hit"
+                    hooks.metadata["answer_similarity"] = round(cached[1], 4)
+                return {"response": cached[0]}
+
+        # ================= PROMPT ASSEMBLY =================
+        # static prefix, then the user name, then the retrieved context
+        rag_context = build_context(user_message)
+        prompt = build_fallback_prompt(user_message, user_name, rag_context)
+        _record_prompt_tokens(prompt.tokens)
 
-        message = response.choices[0].message
+        message = _fallback_completion(prompt.messages, prompt.completion_args)
 
         #tool calls handling
 
@@ -2175,31 +1962,7 @@ Do NOT mix up content from different documents. They describe DIFFERENT features
 
             if function_name == "get_quote":
 
-                required_fields = ["from_pincode", "to_pincode", "weight", "length", "width", "height"]
-
-                for field in required_fields:
-                    if field not in args or args[field] in [None, "", 0]:
-                        return {"response": f"Please provide {field.replace('_',' ')}."}
-
-                # strict pincode validation
-                if not re.match(r"^\d{6}$", str(args["from_pincode"])):
-                    return {"response": "Invalid from pincode. It must be 6 digits."}
-
-                if not re.match(r"^\d{6}$", str(args["to_pincode"])):
-                    return {"response": "Invalid to pincode. It must be 6 digits."}
-
-                conversation_state.update(args)
-
-                result = get_quote(
-                    str(args["from_pincode"]),
-                    str(args["to_pincode"]),
-                    float(args["weight"]),
-                    float(args["length"]),
-                    float(args["width"]),
-                    float(args["height"])
-                )
-
-                return format_quote(result)
+                return _apply_quote_tool_args(args)
 
             elif function_name == "get_tracking":
 
@@ -2213,8 +1976,14 @@ Do NOT mix up content from different documents. They describe DIFFERENT features
 
         final_response = message.content
 
+        if answer_cacheable and rag_context:
+            store_answer(user_message, final_response, answer_scope, kb_version)
+
         return {"response": final_response}
 
+    except TurnCancelled:
+        raise
+
     except Exception:
         return {"response": "Unable to process your request right now. Please try again."}
 
@@ -0,0 +1,117 @@
+"""
+Cache
+Thread-safe in-process LRU cache with optional per-entry TTL and hit/miss
+counters, plus an asyncio singleflight. Shared by the service and
+retrieval caches.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+# Returned by get() on a miss, so that None can be cached as a value
+MISSING = object()
+
+
+class TTLCache:
+
+    def __init__(self, maxsize: int, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()  # key -> (expires_at | None, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.time():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl: float | None = MISSING):
+        ttl = self.ttl if ttl is MISSING else ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+class AsyncSingleflight:
+    """
+    Coalesces concurrent calls with the same key on the same event loop:
+    the first caller starts the coroutine, later callers await its result.
+    """
+
+    def __init__(self):
+        self._inflight: dict = {}  # (loop id, key) -> [task, waiter count]
+        self.coalesced = 0
+
+    async def do(self, key, coro_factory):
+        """
+        The call runs as its own task and every caller (leader included)
+        awaits it through shield, so a cancelled caller only stops waiting.
+        The task itself is cancelled once no caller is left waiting for it.
+        """
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+
+        flight = self._inflight.get(flight_key)
+        if flight is None:
+            flight = [asyncio.ensure_future(coro_factory()), 0]
+            self._inflight[flight_key] = flight
+            flight[0].add_done_callback(lambda task: self._finish(flight_key, flight))
+        else:
+            self.coalesced += 1
+
+        task = flight[0]
+        flight[1] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            flight[1] -= 1
+            if flight[1] == 0 and not task.done():
+                self._finish(flight_key, flight)
+                task.cancel()
+
+    def _finish(self, flight_key, flight):
+        if self._inflight.get(flight_key) is flight:
+            del self._inflight[flight_key]
+        task = flight[0]
+        # mark the exception retrieved, so a flight nobody awaits does not warn
+        if task.done() and not task.cancelled():
+            task.exception()
@@ -0,0 +1,64 @@
+"""
+Chat Configuration
+Centralized settings for chat sessions and request handling.
+Every value can be overridden through an environment variable.
+"""
+import os
+import secrets
+from dotenv import load_dotenv
+
+# values below may come from .env; load it before they are read
+load_dotenv()
+
+# =====================================================
+# PATHS
+# =====================================================
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# =====================================================
+# SESSIONS
+# =====================================================
+# "memory" (in-process LRU) or "sqlite" (shared by all workers on a host)
+SESSION_BACKEND = os.getenv("PHOTON_SESSION_BACKEND", "memory")
+SESSION_TTL_SECONDS = int(os.getenv("PHOTON_SESSION_TTL_SECONDS", "1800"))
+SESSION_MAX_SESSIONS = int(os.getenv("PHOTON_SESSION_MAX_SESSIONS", "5000"))
+SESSION_SQLITE_PATH = os.getenv(
+    "PHOTON_SESSION_SQLITE_PATH",
+    os.path.join(BASE_DIR, "vector_store", "sessions.sqlite3"),
+)
+
+# HMAC key for session ids: only ids this server issued are accepted.
+# Unset means a random per-process key, so sessions do not survive a
+# restart or move between workers; set it when workers share the sqlite store.
+SESSION_SECRET = os.getenv("PHOTON_SESSION_SECRET") or secrets.token_hex(32)
+
+SESSION_COOKIE_NAME = "photon_session"
+SESSION_HEADER_NAME = "X-Session-Id"
+
+# =====================================================
+# TURN EXECUTION
+# =====================================================
+# Orchestrator turns are blocking (Photon API, Groq, Chroma), so they run
+# on a bounded thread pool instead of the event loop.
+CHAT_WORKERS = int(os.getenv("PHOTON_CHAT_WORKERS", "16"))
+# Turns allowed to wait for a free worker before new ones get a 503
+CHAT_MAX_QUEUE = int(os.getenv("PHOTON_CHAT_MAX_QUEUE", "64"))
+CHAT_TIMEOUT_SECONDS = float(os.getenv("PHOTON_CHAT_TIMEOUT_SECONDS", "60"))
+
+# =====================================================
+# INTENT MATCHING
+# =====================================================
+# Phrase tables for detect_intent and knowledge-base source routing
+INTENT_PHRASES_PATH = os.getenv(
+    "PHOTON_INTENT_PHRASES_PATH",
+    os.path.join(BASE_DIR, "core", "intent_phrases.json"),
+)
+
+# =====================================================
+# LLM
+# =====================================================
+# Groq (or any OpenAI-compatible) endpoint. Unset means the Groq SDK
+# default, which also honours GROQ_BASE_URL from .env at client creation.
+# Point it at simulators/groq_server.py to run without the network.
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None
+LLM_MODEL = os.getenv("PHOTON_LLM_MODEL", "llama-3.1-8b-instant")
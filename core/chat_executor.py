@@ -0,0 +1,114 @@
+"""
+Chat Executor
+Dispatches blocking orchestrator turns to a bounded thread pool so a slow
+quote or LLM call never stalls the event loop.
+
+Admission is capped at workers + queue depth; beyond that callers get
+ExecutorBusy (served as 503). Queue wait and execution time are recorded
+so the pool can be sized from real traffic.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from core.chat_config import CHAT_WORKERS, CHAT_MAX_QUEUE, CHAT_TIMEOUT_SECONDS
+from core.metrics import RollingTimings
+
+
+class ExecutorBusy(Exception):
+    """All workers are busy and the wait queue is full."""
+
+
+class ExecutorTimeout(Exception):
+    """The turn did not finish within the per-request timeout."""
+
+
+class ChatExecutor:
+
+    def __init__(self, max_workers: int = CHAT_WORKERS, max_queue: int = CHAT_MAX_QUEUE,
+                 timeout_seconds: float = CHAT_TIMEOUT_SECONDS):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout_seconds = timeout_seconds
+
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="photon-chat")
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._running = 0
+
+        self._counters = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "timed_out": 0}
+        self._queue_wait = RollingTimings()
+        self._execution = RollingTimings()
+
+    def _admit(self) -> bool:
+        with self._lock:
+            if self._admitted >= self.max_workers + self.max_queue:
+                self._counters["rejected"] += 1
+                return False
+            self._admitted += 1
+            self._counters["submitted"] += 1
+            return True
+
+    def _release(self, _future=None):
+        # Runs when the job finishes, fails or is cancelled before starting.
+        # A turn that timed out keeps its slot until its thread really ends.
+        with self._lock:
+            self._admitted -= 1
+
+    def _wrap(self, fn, args, kwargs, submitted_at):
+        def job():
+            started = time.perf_counter()
+            with self._lock:
+                self._running += 1
+                self._queue_wait.add(started - submitted_at)
+            ok = False
+            try:
+                result = fn(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._execution.add(time.perf_counter() - started)
+                    self._counters["completed" if ok else "failed"] += 1
+        return job
+
+    async def run(self, fn, *args, timeout: float | None = None, **kwargs):
+        """
+        Run fn(*args, **kwargs) on the pool and await its result.
+        Raises ExecutorBusy when admission is full and ExecutorTimeout when
+        the turn takes longer than the timeout.
+        """
+        if not self._admit():
+            raise ExecutorBusy()
+
+        future = self._pool.submit(self._wrap(fn, args, kwargs, time.perf_counter()))
+        future.add_done_callback(self._release)
+
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(future)),
+                self.timeout_seconds if timeout is None else timeout,
+            )
+        except asyncio.TimeoutError:
+            # Only succeeds if the job is still queued; a running thread cannot be interrupted
+            future.cancel()
+            with self._lock:
+                self._counters["timed_out"] += 1
+            raise ExecutorTimeout()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "timeout_seconds": self.timeout_seconds,
+                "running": self._running,
+                "queued": max(0, self._admitted - self._running),
+                **self._counters,
+                "queue_wait": self._queue_wait.summary(),
+                "execution": self._execution.summary(),
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
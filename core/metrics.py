@@ -0,0 +1,47 @@
+"""
+Metrics
+Small in-process timing and size helpers behind the /metrics endpoint.
+"""
+from collections import deque
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+class RollingValues:
+    """Rolling window of values; summary keys carry an optional unit suffix."""
+
+    def __init__(self, window: int = 1000, suffix: str = ""):
+        self._values = deque(maxlen=window)
+        self._suffix = suffix
+        self.max_value = 0.0
+
+    def add(self, value: float):
+        self._values.append(value)
+        if value > self.max_value:
+            self.max_value = value
+
+    def summary(self) -> dict:
+        values = sorted(self._values)
+        s = self._suffix
+        return {
+            "count": len(values),
+            f"avg{s}": round(sum(values) / len(values), 2) if values else 0.0,
+            f"p50{s}": round(percentile(values, 50), 2),
+            f"p95{s}": round(percentile(values, 95), 2),
+            f"max{s}": round(self.max_value, 2),
+        }
+
+
+class RollingTimings(RollingValues):
+    """Rolling window of durations in milliseconds."""
+
+    def __init__(self, window: int = 1000):
+        super().__init__(window, suffix="_ms")
+
+    def add(self, seconds: float):
+        super().add(seconds * 1000)
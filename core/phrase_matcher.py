@@ -0,0 +1,192 @@
+"""
+Phrase Matcher
+Precompiled multi-phrase matching for intent detection and source routing.
+
+Phrase tables are loaded from core/intent_phrases.json and compiled once:
+- every "contains" phrase across all rules goes into a single trie-shaped
+  regex, scanned in one left-to-right pass that also reports overlapping
+  phrases,
+- "prefixes" become one anchored trie regex,
+- "exact" phrases become a dict lookup.
+
+Small tables of "contains" phrases only (the source table) skip the regex:
+below PLAIN_SCAN_MAX_PHRASES a plain substring scan is faster, as
+benchmarks/bench_intent.py shows.
+
+Rules are evaluated in file order and the first satisfied rule wins, which
+preserves the priority of the old if-chains. A rule with "match": "all"
+needs every one of its tables to hit (e.g. a question prefix AND an
+info keyword); otherwise any table is enough.
+"""
+import json
+import re
+from functools import lru_cache
+from typing import NamedTuple
+from core.chat_config import INTENT_PHRASES_PATH
+
+# Up to this many "contains" phrases, a substring check per phrase beats the trie regex
+PLAIN_SCAN_MAX_PHRASES = 32
+
+
+class Span(NamedTuple):
+    kind: str    # "contains" | "prefix" | "exact"
+    phrase: str
+    start: int
+    end: int
+
+
+class PhraseMatch(NamedTuple):
+    name: str
+    value: object       # the rule's "intent" (may be None)
+    spans: tuple        # Span per table that hit, first occurrence
+
+
+def _trie_pattern(phrases) -> str:
+    """
+    Alternation factored on common prefixes ("ship a box|ship from" ->
+    "ship (?:a box|from)"), so the regex engine walks a trie instead of
+    retrying every phrase at every position. Longer phrases win.
+    """
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+def _prefix_owners(phrases: dict) -> dict:
+    """
+    For each phrase, the rules hit when it is the longest match at a
+    position: its own rules plus those of every phrase that is a prefix of
+    it (they necessarily match at the same position).
+    phrases: phrase -> set of rule indexes. Returns phrase -> {rule: phrase}.
+    """
+    owners = {}
+    for phrase in phrases:
+        hits = {}
+        for other, rules in phrases.items():
+            if phrase.startswith(other):
+                for rule in rules:
+                    # keep the longest phrase of each rule as its span
+                    if len(other) > len(hits.get(rule, "")):
+                        hits[rule] = other
+        owners[phrase] = hits
+    return owners
+
+
+class PhraseMatcher:
+
+    def __init__(self, rules: list[dict]):
+        self.rules = rules
+
+        contains, prefixes, exact = {}, {}, {}
+        for i, rule in enumerate(rules):
+            for phrase in rule.get("contains", ()):
+                contains.setdefault(phrase.lower(), set()).add(i)
+            for phrase in rule.get("prefixes", ()):
+                prefixes.setdefault(phrase.lower(), set()).add(i)
+            for phrase in rule.get("exact", ()):
+                exact.setdefault(phrase.lower(), []).append(i)
+
+        self._contains_owners = _prefix_owners(contains)
+        self._prefix_owners = _prefix_owners(prefixes)
+        self._exact = exact
+        self._contains_re = re.compile(_trie_pattern(contains)) if contains else None
+        self._prefix_re = re.compile(_trie_pattern(prefixes)) if prefixes else None
+        self._required = [
+            {kind for kind, key in (("contains", "contains"), ("prefix", "prefixes"), ("exact", "exact"))
+             if rule.get(key)}
+            if rule.get("match") == "all" else None
+            for rule in rules
+        ]
+
+        # (rule index, phrases) when the plain scan is the faster path
+        self._plain = None
+        if (all(set(rule) <= {"name", "intent", "contains"} for rule in rules)
+                and sum(len(phrases) for phrases in contains.values()) <= PLAIN_SCAN_MAX_PHRASES):
+            self._plain = [
+                (i, tuple(phrase.lower() for phrase in rule.get("contains", ())))
+                for i, rule in enumerate(rules)
+            ]
+
+    def scan(self, text: str) -> dict:
+        """All table hits: rule index -> {kind: Span}, first occurrence per table."""
+        text = text.lower().strip()
+        hits: dict[int, dict] = {}
+
+        for rule in self._exact.get(text, ()):
+            hits[rule] = {"exact": Span("exact", text, 0, len(text))}
+
+        if self._prefix_re is not None:
+            m = self._prefix_re.match(text)
+            if m is not None:
+                for rule, phrase in self._prefix_owners[m.group()].items():
+                    hits.setdefault(rule, {})["prefix"] = Span("prefix", phrase, 0, len(phrase))
+
+        if self._contains_re is not None:
+            # search() restarted one character after each hit finds the
+            # longest phrase at every start position, overlaps included
+            search = self._contains_re.search
+            m = search(text)
+            while m is not None:
+                start = m.start()
+                for rule, phrase in self._contains_owners[m.group()].items():
+                    kinds = hits.setdefault(rule, {})
+                    if "contains" not in kinds:
+                        kinds["contains"] = Span("contains", phrase, start, start + len(phrase))
+                m = search(text, start + 1)
+
+        return hits
+
+    def match(self, text: str) -> PhraseMatch | None:
+        """First rule (in file order) satisfied by text, or None."""
+        if self._plain is not None:
+            return self._match_plain(text.lower().strip())
+        hits = self.scan(text)
+        if not hits:
+            return None
+        for i in sorted(hits):
+            kinds = hits[i]
+            required = self._required[i]
+            if required is not None and not required <= kinds.keys():
+                continue
+            rule = self.rules[i]
+            spans = tuple(sorted(kinds.values(), key=lambda s: s.start))
+            return PhraseMatch(rule["name"], rule.get("intent"), spans)
+        return None
+
+    def _match_plain(self, text: str) -> PhraseMatch | None:
+        for i, phrases in self._plain:
+            for phrase in phrases:
+                if phrase in text:
+                    rule = self.rules[i]
+                    start = text.find(phrase)
+                    return PhraseMatch(rule["name"], rule.get("intent"),
+                                       (Span("contains", phrase, start, start + len(phrase)),))
+        return None
+
+
+@lru_cache(maxsize=None)
+def _load_tables(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=None)
+def get_intent_matcher(path: str = INTENT_PHRASES_PATH) -> PhraseMatcher:
+    return PhraseMatcher(_load_tables(path)["intents"])
+
+
+@lru_cache(maxsize=None)
+def get_source_matcher(path: str = INTENT_PHRASES_PATH) -> PhraseMatcher:
+    return PhraseMatcher(_load_tables(path)["sources"])
@@ -0,0 +1,286 @@
+"""
+Session Store
+Keeps one conversation state per chat session so concurrent users never
+share or clobber each other's flow.
+
+States are stored compactly: only the keys that differ from the default
+state are kept, and the full state is rebuilt on load.
+
+Backends:
+  - MemorySessionStore: in-process LRU with TTL eviction and a session cap.
+  - SqliteSessionStore: SQLite table, survives restarts and is shared by
+    every worker process on the same host.
+"""
+import hashlib
+import hmac
+import json
+import os
+import re
+import secrets
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from core.chat_config import (
+    SESSION_BACKEND,
+    SESSION_TTL_SECONDS,
+    SESSION_MAX_SESSIONS,
+    SESSION_SQLITE_PATH,
+    SESSION_SECRET,
+)
+
+# "<32 hex random>_<32 hex HMAC>": a client cannot pick or forge its id
+_SESSION_ID_RE = re.compile(r"^([0-9a-f]{32})_([0-9a-f]{32})$")
+
+
+def _sign(token: str) -> str:
+    return hmac.new(SESSION_SECRET.encode(), token.encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def new_session_id() -> str:
+    token = secrets.token_hex(16)
+    return f"{token}_{_sign(token)}"
+
+
+def is_valid_session_id(session_id) -> bool:
+    """True only for ids issued by new_session_id with this SESSION_SECRET."""
+    match = _SESSION_ID_RE.match(str(session_id)) if session_id else None
+    return bool(match) and hmac.compare_digest(match.group(2), _sign(match.group(1)))
+
+
+class BaseSessionStore:
+    """
+    Common compaction and per-session locking.
+    Subclasses implement _load / _save / delete / stats.
+    """
+
+    def __init__(self, default_factory, ttl_seconds: int, max_sessions: int):
+        self._default_factory = default_factory
+        self._defaults = default_factory()
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+
+        self._locks = weakref.WeakValueDictionary()
+        self._locks_guard = threading.Lock()
+
+    # ---------- compaction ----------
+
+    def _compact(self, state: dict) -> dict:
+        defaults = self._defaults
+        return {
+            k: v for k, v in state.items()
+            if k not in defaults or defaults[k] != v
+        }
+
+    def _expand(self, compact: dict | None) -> dict:
+        # The compact dict is owned by the store and the previous turn's state
+        # is discarded, so its values can be adopted without copying
+        state = self._default_factory()
+        if compact:
+            state.update(compact)
+        return state
+
+    # ---------- locking ----------
+
+    def _lock_for(self, session_id: str) -> threading.Lock:
+        with self._locks_guard:
+            lock = self._locks.get(session_id)
+            if lock is None:
+                lock = threading.Lock()
+                self._locks[session_id] = lock
+            return lock
+
+    @contextmanager
+    def session(self, session_id: str):
+        """
+        Load the state for session_id, yield it for the duration of one
+        turn and persist it afterwards. Turns of the same session are
+        serialized; different sessions run fully in parallel.
+        """
+        lock = self._lock_for(session_id)
+        with lock:
+            state = self._expand(self._load(session_id))
+            try:
+                yield state
+            finally:
+                self._save(session_id, self._compact(state))
+
+    def reset(self, session_id: str):
+        """
+        Drop the stored state of session_id. Takes the session lock, so it
+        runs after any in-flight turn has saved (even one whose caller
+        already gave up on it) and that save cannot overwrite the reset.
+        Blocks for as long as such a turn runs.
+        """
+        with self._lock_for(session_id):
+            self.delete(session_id)
+
+    # ---------- backend interface ----------
+
+    def _load(self, session_id: str) -> dict | None:
+        raise NotImplementedError
+
+    def _save(self, session_id: str, compact: dict):
+        raise NotImplementedError
+
+    def delete(self, session_id: str):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        raise NotImplementedError
+
+
+class MemorySessionStore(BaseSessionStore):
+    """In-process LRU keyed on session id, oldest-accessed first."""
+
+    def __init__(self, default_factory, ttl_seconds: int = SESSION_TTL_SECONDS,
+                 max_sessions: int = SESSION_MAX_SESSIONS):
+        super().__init__(default_factory, ttl_seconds, max_sessions)
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._guard = threading.Lock()
+        self._evicted = 0
+
+    def _evict(self, now: float):
+        # LRU order is also last-access order, so expired entries sit at the front
+        while self._entries:
+            touched, _ = next(iter(self._entries.values()))
+            if now - touched <= self.ttl_seconds and len(self._entries) <= self.max_sessions:
+                break
+            self._entries.popitem(last=False)
+            self._evicted += 1
+
+    def _load(self, session_id: str) -> dict | None:
+        now = time.time()
+        with self._guard:
+            self._evict(now)
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            self._entries.move_to_end(session_id)
+            return entry[1]
+
+    def _save(self, session_id: str, compact: dict):
+        now = time.time()
+        with self._guard:
+            self._entries[session_id] = (now, compact)
+            self._entries.move_to_end(session_id)
+            self._evict(now)
+
+    def delete(self, session_id: str):
+        with self._guard:
+            self._entries.pop(session_id, None)
+
+    def stats(self) -> dict:
+        with self._guard:
+            return {
+                "backend": "memory",
+                "active_sessions": len(self._entries),
+                "evicted_sessions": self._evicted,
+                "max_sessions": self.max_sessions,
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+
+class SqliteSessionStore(BaseSessionStore):
+    """SQLite-backed store; one connection per thread, WAL journal."""
+
+    # Expired/over-cap rows are purged every N saves rather than on every turn
+    PURGE_EVERY = 200
+
+    def __init__(self, default_factory, path: str = SESSION_SQLITE_PATH,
+                 ttl_seconds: int = SESSION_TTL_SECONDS,
+                 max_sessions: int = SESSION_MAX_SESSIONS):
+        super().__init__(default_factory, ttl_seconds, max_sessions)
+        self.path = path
+        self._local = threading.local()
+        self._saves = 0
+        self._saves_guard = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY,"
+            " state TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions(updated_at)"
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _load(self, session_id: str) -> dict | None:
+        row = self._conn().execute(
+            "SELECT state FROM sessions WHERE session_id = ? AND updated_at >= ?",
+            (session_id, time.time() - self.ttl_seconds),
+        ).fetchone()
+        if not row:
+            return None
+        try:
+            return json.loads(row[0])
+        except ValueError:
+            return None
+
+    def _save(self, session_id: str, compact: dict):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions (session_id, state, updated_at) VALUES (?, ?, ?)",
+            (session_id, json.dumps(compact, separators=(",", ":"), default=str), time.time()),
+        )
+        conn.commit()
+
+        with self._saves_guard:
+            self._saves += 1
+            purge = self._saves % self.PURGE_EVERY == 0
+        if purge:
+            self.purge()
+
+    def purge(self):
+        """Drop expired sessions and the least recently used ones over the cap."""
+        conn = self._conn()
+        conn.execute(
+            "DELETE FROM sessions WHERE updated_at < ?",
+            (time.time() - self.ttl_seconds,),
+        )
+        conn.execute(
+            "DELETE FROM sessions WHERE session_id IN ("
+            " SELECT session_id FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,),
+        )
+        conn.commit()
+
+    def delete(self, session_id: str):
+        conn = self._conn()
+        conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        conn.commit()
+
+    def stats(self) -> dict:
+        count = self._conn().execute(
+            "SELECT COUNT(*) FROM sessions WHERE updated_at >= ?",
+            (time.time() - self.ttl_seconds,),
+        ).fetchone()[0]
+        return {
+            "backend": "sqlite",
+            "active_sessions": count,
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+def create_session_store(default_factory, backend: str = SESSION_BACKEND) -> BaseSessionStore:
+    if backend == "sqlite":
+        return SqliteSessionStore(default_factory)
+    if backend == "memory":
+        return MemorySessionStore(default_factory)
+    raise ValueError(f"Unknown session backend: {backend}")
@@ -0,0 +1,79 @@
+"""
+Turn Hooks
+Per-turn callbacks that let streaming transports (SSE, WebSocket) observe a
+chat turn while it runs on a worker thread: LLM tokens, progress messages
+and cancellation.
+
+The hooks travel in a ContextVar, so the orchestrator can reach them from
+anywhere in the turn without threading them through every call. Turns
+started without hooks (plain POST /chat) behave exactly as before.
+"""
+import functools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+class TurnCancelled(Exception):
+    """The client cancelled the turn or went away."""
+
+
+class TurnHooks:
+
+    def __init__(self, on_token=None, on_progress=None):
+        self.on_token = on_token
+        self.on_progress = on_progress
+        # filled in by the orchestrator (e.g. ttft_ms) and sent with the final event
+        self.metadata: dict = {}
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def raise_if_cancelled(self):
+        if self._cancelled.is_set():
+            raise TurnCancelled()
+
+
+_current_hooks: ContextVar[TurnHooks | None] = ContextVar("turn_hooks", default=None)
+
+
+def get_turn_hooks() -> TurnHooks | None:
+    return _current_hooks.get()
+
+
+@contextmanager
+def use_turn_hooks(hooks: TurnHooks | None):
+    token = _current_hooks.set(hooks)
+    try:
+        yield hooks
+    finally:
+        _current_hooks.reset(token)
+
+
+def report_progress(message: str):
+    """
+    Send a progress line to the turn's client, if it has one. Also a
+    cancellation checkpoint: raises TurnCancelled for a cancelled turn.
+    """
+    hooks = _current_hooks.get()
+    if hooks is None:
+        return
+    hooks.raise_if_cancelled()
+    if hooks.on_progress is not None:
+        hooks.on_progress(message)
+
+
+def with_progress(message: str):
+    """Decorator: report_progress(message) before each call of fn."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            report_progress(message)
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,21 +1,57 @@
-from fastapi import FastAPI, UploadFile, File
-from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi import FastAPI, UploadFile, File, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import HTMLResponse, StreamingResponse, JSONResponse
 from pydantic import BaseModel
-from core.ai_orchestrator import handle_chat, reset_state
+from core.ai_orchestrator import (
+    handle_chat,
+    reset_state,
+    get_session_stats,
+    get_llm_prefilter_stats,
+    get_llm_stats,
+)
+from core.chat_executor import ChatExecutor, ExecutorBusy, ExecutorTimeout
+from core.turn_hooks import TurnHooks, TurnCancelled
+from core.session_store import new_session_id, is_valid_session_id
+from core.chat_config import SESSION_COOKIE_NAME, SESSION_HEADER_NAME, SESSION_TTL_SECONDS
 from services.auth_service import get_logged_user_name
-from services.shipping_service import print_label
+from services.shipping_service import async_print_label
+from services.http_client import close_clients
+from services.api_logging import configure_api_logging, stop_api_logging
+from services.pincode_cache import get_pincode_cache
+from services.address_directory import address_directory
+from services.quote_cache import quote_cache
 from pipelines.ingestion_pipeline import ingest_documents
 from retrieval.vector_store import get_store_stats
-from retrieval.rag_config import KNOWLEDGE_BASE_DIR
+from retrieval.rag_retriever import get_context_cache_stats, warm_retrieval_backend
+from retrieval.answer_cache import get_answer_cache_stats
+from retrieval.rag_config import KNOWLEDGE_BASE_DIR, EMBEDDING_PRELOAD, EMBEDDING_WARMUP_ON_STARTUP
+from retrieval.embedding_manager import (
+    preload_model,
+    start_background_warmup,
+    is_model_ready,
+    get_model_status,
+    get_query_cache_stats,
+)
 from fastapi.staticfiles import StaticFiles
+import asyncio
 import base64
 import io
+import json
 import os
 import logging
+import time
+import uuid
 
 logger = logging.getLogger("photon.main")
 
+# With `gunicorn --preload -k uvicorn.workers.UvicornWorker`, this runs once
+# in the master process and the forked workers share the loaded weights.
+# Threads do not survive fork, so everything thread-backed (API log
+# listener, warm-up) starts per worker in the startup hooks below.
+if EMBEDDING_PRELOAD:
+    preload_model()
+
 app = FastAPI()
+chat_executor = ChatExecutor()
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 class ChatRequest(BaseModel):
@@ -713,6 +749,12 @@ body {
     border: 1px solid #e8ecef;
 }
 
+.typing-progress {
+    font-size: 12px;
+    color: #5f7a7a;
+    margin-right: 6px;
+}
+
 /* ===== HI BUBBLE ===== */
 .chat-hi-bubble {
     position: fixed;
@@ -1044,6 +1086,23 @@ function showTyping(){
     messagesDiv.scrollTop = messagesDiv.scrollHeight;
 }
 
+/* Progress line inside the typing indicator (e.g. while quotes are fetched) */
+function showProgress(message){
+
+    let typing = document.querySelector("#typing .bot-typing");
+    if (!typing) return;
+
+    typing.innerHTML = `
+        <div class="typing-progress">${message}</div>
+        <div class="typing">
+            <span></span><span></span><span></span>
+        </div>
+    `;
+
+    let messagesDiv = document.getElementById("messages");
+    messagesDiv.scrollTop = messagesDiv.scrollHeight;
+}
+
 /* Send Message */
 async function sendMessage() {
     let input = document.getElementById("messageInput");
@@ -1071,28 +1130,11 @@ async function sendMessage() {
 
     messagesDiv.scrollTop = messagesDiv.scrollHeight;
 
-    let response = await fetch("/chat", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ message: message })
-    });
-
-    let data = await response.json();
-
-    // Remove sending bubble
-    let bubble = document.getElementById("sendingBubble");
-    if (bubble) bubble.remove();
-
-    // Now show bot typing
-    showTyping();
-    setTimeout(() => {
-        removeTyping();
-        renderBotResponse(data);
-    }, 500);
+    await streamChat(message);
 }
 
-/* Render Bot */
-function renderBotResponse(data) {
+/* Bot row: avatar + content column + message bubble */
+function createBotRow() {
 
     let messagesDiv = document.getElementById("messages");
 
@@ -1110,18 +1152,26 @@ function renderBotResponse(data) {
     // Message bubble
     let botDiv = document.createElement("div");
     botDiv.className = "bot";
-    botDiv.innerHTML = data.response || "Something went wrong.";
 
     content.appendChild(botDiv);
 
-    // Append
+    row.appendChild(avatar);
+    row.appendChild(content);
+
+    messagesDiv.appendChild(row);
+
+    return { content: content, botDiv: botDiv };
+}
+
+function renderOptions(content, options) {
+
     /* OPTIONS */
-    if (data.options && data.options.length > 0) {
+    if (options && options.length > 0) {
 
         let wrapper = document.createElement("div");
         wrapper.className = "options-wrapper";
 
-        data.options.forEach(option => {
+        options.forEach(option => {
 
             let btn = document.createElement("button");
             btn.className = "option-btn";
@@ -1138,15 +1188,101 @@ function renderBotResponse(data) {
 
         content.appendChild(wrapper);
     }
+}
 
-    row.appendChild(avatar);
-    row.appendChild(content);
+/* Render Bot */
+function renderBotResponse(data) {
 
-    messagesDiv.appendChild(row);
+    let messagesDiv = document.getElementById("messages");
+
+    let bot = createBotRow();
+    bot.botDiv.innerHTML = data.response || "Something went wrong.";
+
+    renderOptions(bot.content, data.options);
 
     messagesDiv.scrollTop = messagesDiv.scrollHeight;
 }
 
+/* Parse one SSE block ("event: x\\ndata: {...}") */
+function parseSseEvent(raw) {
+    let event = "message";
+    let data = "";
+    raw.split("\\n").forEach(line => {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data += line.slice(5).trim();
+    });
+    if (!data) return null;
+    return { type: event, data: JSON.parse(data) };
+}
+
+/* Stream a turn from /chat/stream: LLM tokens render as they arrive */
+async function streamChat(message) {
+
+    let messagesDiv = document.getElementById("messages");
+
+    let response = await fetch("/chat/stream", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ message: message })
+    });
+
+    // Sending bubble → bot typing until the first token arrives
+    let sending = document.getElementById("sendingBubble");
+    if (sending) {
+        sending.remove();
+        showTyping();
+    }
+
+    if (!response.ok || !response.body) {
+        let data = await response.json().catch(() => ({}));
+        removeTyping();
+        renderBotResponse(data);
+        return;
+    }
+
+    let reader = response.body.getReader();
+    let decoder = new TextDecoder();
+    let buffer = "";
+    let bot = null;
+    let text = "";
+
+    while (true) {
+        let { value, done } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        let blocks = buffer.split("\\n\\n");
+        buffer = blocks.pop();
+
+        for (let raw of blocks) {
+            let event = parseSseEvent(raw);
+            if (!event) continue;
+
+            if (event.type === "token") {
+                if (!bot) {
+                    removeTyping();
+                    bot = createBotRow();
+                }
+                text += event.data.text;
+                bot.botDiv.innerHTML = text;
+            }
+            else if (event.type === "progress") {
+                if (!bot) showProgress(event.data.message);
+            }
+            else if (event.type === "final" || event.type === "error" || event.type === "cancelled") {
+                removeTyping();
+                if (bot) {
+                    bot.botDiv.innerHTML = event.data.response || text;
+                    renderOptions(bot.content, event.data.options);
+                } else {
+                    renderBotResponse(event.data);
+                }
+            }
+            messagesDiv.scrollTop = messagesDiv.scrollHeight;
+        }
+    }
+}
+
 async function sendOption(value, label) {
     let messagesDiv = document.getElementById("messages");
 
@@ -1158,15 +1294,7 @@ async function sendOption(value, label) {
     messagesDiv.innerHTML += `<div class="user">${cleanLabel}</div>`;
     showTyping();
 
-    let response = await fetch("/chat", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ message: value })
-    });
-
-    let data = await response.json();
-    removeTyping();
-    renderBotResponse(data);
+    await streamChat(value);
 }
 
 function removeTyping(){
@@ -1405,24 +1533,295 @@ startHiBubble();
 """
     return html_content.replace("{name}", name)
 
+# ================= SESSIONS =================
+
+def resolve_session_id(http_request: Request, response: Response) -> str:
+    """
+    Session id from the X-Session-Id header or the session cookie.
+    Only ids signed by this server are accepted; otherwise a new one is
+    issued (and set as cookie), so a client cannot choose its session.
+    """
+    session_id = (
+        http_request.headers.get(SESSION_HEADER_NAME)
+        or http_request.cookies.get(SESSION_COOKIE_NAME)
+    )
+    if not is_valid_session_id(session_id):
+        session_id = new_session_id()
+
+    response.set_cookie(
+        SESSION_COOKIE_NAME,
+        session_id,
+        max_age=SESSION_TTL_SECONDS,
+        httponly=True,
+        samesite="lax",
+    )
+    return session_id
+
+
+def with_session_cookie(error: Response, response: Response) -> Response:
+    """
+    A Response returned directly bypasses the injected one, so copy over the
+    session cookie resolve_session_id may have issued; a retry then keeps
+    the same session.
+    """
+    for value in response.headers.getlist("set-cookie"):
+        error.headers.append("set-cookie", value)
+    return error
+
+
+BUSY_MESSAGE = "The assistant is busy right now. Please try again in a moment."
+TIMEOUT_MESSAGE = "This is taking longer than expected. Please try again."
+
+
 @app.post("/chat")
-async def chat(request: ChatRequest):
-    return handle_chat(request.message)
+async def chat(request: ChatRequest, http_request: Request, response: Response):
+    session_id = resolve_session_id(http_request, response)
+
+    try:
+        return await chat_executor.run(handle_chat, request.message, session_id)
+    except ExecutorBusy:
+        return with_session_cookie(JSONResponse(
+            status_code=503,
+            headers={"Retry-After": "2"},
+            content={"response": BUSY_MESSAGE},
+        ), response)
+    except ExecutorTimeout:
+        return with_session_cookie(JSONResponse(
+            status_code=504,
+            content={"response": TIMEOUT_MESSAGE},
+        ), response)
+
+
+async def run_streamed_turn(message: str, session_id: str, hooks: TurnHooks) -> tuple[str, dict]:
+    """
+    Run one turn for a streaming transport (SSE / WebSocket) and map the
+    outcome to a ("final" | "error" | "cancelled", payload) event.
+    """
+    started = time.perf_counter()
+    try:
+        result = await chat_executor.run(handle_chat, message, session_id, hooks)
+    except ExecutorBusy:
+        return "error", {"response": BUSY_MESSAGE, "status": 503}
+    except ExecutorTimeout:
+        # the worker keeps running; stop it at its next checkpoint
+        hooks.cancel()
+        return "error", {"response": TIMEOUT_MESSAGE, "status": 504}
+    except TurnCancelled:
+        return "cancelled", {"response": "Cancelled."}
+
+    metadata = {
+        **hooks.metadata,
+        "session_id": session_id,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+    return "final", {**result, "options": result.get("options", []), "metadata": metadata}
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request):
+    """
+    Server-Sent Events version of /chat. Events:
+      token      {"text"}                            LLM output as it is generated
+      progress   {"message"}                         status of long-running steps
+      final      {"response", "options", "metadata"} the complete turn result
+      error      {"response", "status"}              busy / timeout
+      cancelled  {"response"}
+    Non-LLM turns (menus, flows) only send progress and the final event.
+    """
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+
+    def emit(event, data):
+        loop.call_soon_threadsafe(events.put_nowait, (event, data))
+
+    hooks = TurnHooks(
+        on_token=lambda text: emit("token", {"text": text}),
+        on_progress=lambda message: emit("progress", {"message": message}),
+    )
+
+    async def stream():
+        turn = asyncio.ensure_future(run_streamed_turn(request.message, session_id, hooks))
+        # runs after every token callback already queued by the worker
+        turn.add_done_callback(lambda _: events.put_nowait((None, None)))
+        try:
+            while True:
+                event, data = await events.get()
+                if event is None:
+                    break
+                yield sse_event(event, data)
+
+            event, data = turn.result()
+            yield sse_event(event, data)
+        finally:
+            # client went away: stop generating tokens
+            if not turn.done():
+                hooks.cancel()
+
+    response = StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    session_id = resolve_session_id(http_request, response)
+    return response
+
+
+@app.websocket("/ws/chat")
+async def chat_socket(websocket: WebSocket):
+    """
+    One WebSocket per conversation session.
+
+    Client -> server:
+      {"type": "message", "message": "...", "id": optional turn id}
+      {"type": "cancel"}    stop the running turn
+      {"type": "reset"}     cancel, then clear the session
+      {"type": "ping"}
+    Server -> client (turn events carry the turn "id"):
+      session, token, progress, final, error, cancelled, reset, pong
+    One turn runs at a time; messages sent meanwhile get an error.
+    """
+    session_id = (
+        websocket.query_params.get("session_id")
+        or websocket.headers.get(SESSION_HEADER_NAME)
+        or websocket.cookies.get(SESSION_COOKIE_NAME)
+    )
+    if not is_valid_session_id(session_id):
+        session_id = new_session_id()
+
+    cookie = (
+        f"{SESSION_COOKIE_NAME}={session_id}; Max-Age={SESSION_TTL_SECONDS}; "
+        f"Path=/; HttpOnly; SameSite=Lax"
+    )
+    await websocket.accept(headers=[(b"set-cookie", cookie.encode())])
+
+    loop = asyncio.get_running_loop()
+    # every send goes through one queue / one task, so frames never interleave
+    outbox: asyncio.Queue = asyncio.Queue()
+
+    def emit(payload):
+        loop.call_soon_threadsafe(outbox.put_nowait, payload)
+
+    async def sender():
+        while True:
+            await websocket.send_json(await outbox.get())
+
+    async def run_turn(turn_id, message, hooks):
+        event, data = await run_streamed_turn(message, session_id, hooks)
+        outbox.put_nowait({"type": event, "id": turn_id, **data})
+
+    current_turn = None
+    current_hooks = None
+
+    async def stop_current_turn():
+        if current_turn is not None and not current_turn.done():
+            current_hooks.cancel()
+            await asyncio.wait([current_turn])
+
+    send_task = asyncio.create_task(sender())
+    outbox.put_nowait({"type": "session", "session_id": session_id})
+
+    try:
+        while True:
+            try:
+                data = json.loads(await websocket.receive_text())
+                if not isinstance(data, dict):
+                    raise ValueError("expected a JSON object")
+            except ValueError:
+                outbox.put_nowait({"type": "error", "response": "Invalid JSON.", "status": 400})
+                continue
+
+            kind = data.get("type", "message")
+
+            if kind == "message":
+                if current_turn is not None and not current_turn.done():
+                    outbox.put_nowait({
+                        "type": "error",
+                        "id": data.get("id"),
+                        "response": "A reply is still in progress. Cancel it or wait for it to finish.",
+                        "status": 409,
+                    })
+                    continue
+
+                turn_id = str(data.get("id") or uuid.uuid4().hex[:8])
+                current_hooks = TurnHooks(
+                    on_token=lambda text, i=turn_id: emit({"type": "token", "id": i, "text": text}),
+                    on_progress=lambda message, i=turn_id: emit({"type": "progress", "id": i, "message": message}),
+                )
+                current_turn = asyncio.create_task(
+                    run_turn(turn_id, str(data.get("message", "")), current_hooks)
+                )
+
+            elif kind == "cancel":
+                if current_turn is not None and not current_turn.done():
+                    current_hooks.cancel()
+
+            elif kind == "reset":
+                # stop the turn early; reset_state still waits for its worker
+                # (it may outlive a timed-out turn) under the session lock
+                await stop_current_turn()
+                await asyncio.to_thread(reset_state, session_id)
+                outbox.put_nowait({"type": "reset"})
+
+            elif kind == "ping":
+                outbox.put_nowait({"type": "pong"})
+
+            else:
+                outbox.put_nowait({"type": "error", "response": f"Unknown message type: {kind}", "status": 400})
+
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if current_turn is not None and not current_turn.done():
+            current_hooks.cancel()
+        send_task.cancel()
+
 
 @app.post("/reset")
-async def reset_chat():
-    reset_state()
+async def reset_chat(http_request: Request, response: Response):
+    session_id = resolve_session_id(http_request, response)
+    # waits for an in-flight turn of the session, off the event loop
+    await asyncio.to_thread(reset_state, session_id)
     return {"status": "reset done"}
 
+@app.get("/metrics")
+async def metrics():
+    """Runtime stats for sizing workers and caches."""
+    return {
+        "executor": chat_executor.stats(),
+        "sessions": get_session_stats(),
+        "pincode_cache": get_pincode_cache().stats(),
+        "address_directory": address_directory.stats(),
+        "quote_cache": quote_cache.stats(),
+        "query_embedding_cache": get_query_cache_stats(),
+        "rag_context_cache": get_context_cache_stats(),
+        "answer_cache": get_answer_cache_stats(),
+        "llm_prefilter": get_llm_prefilter_stats(),
+        "llm": get_llm_stats(),
+    }
+
+@app.get("/health")
+async def health():
+    """Readiness probe: 503 until the startup warm-up has finished."""
+    warming = (EMBEDDING_WARMUP_ON_STARTUP or EMBEDDING_PRELOAD) and not is_model_ready()
+    status = {
+        "status": "starting" if warming else "ok",
+        "embedding_model": get_model_status(),
+    }
+    return JSONResponse(status, status_code=503 if warming else 200)
+
 @app.get("/favicon.ico")
 async def favicon():
     return {}
 # ================= DOWNLOAD LABEL =================
 
 @app.get("/download-label")
-def download_label(tracking_no: str):
+async def download_label(tracking_no: str):
 
-    result = print_label(tracking_no)
+    result = await async_print_label(tracking_no)
 
     # API error handling
     if not result or result.get("statusCode") != 200:
@@ -1462,6 +1861,35 @@ def download_label(tracking_no: str):
 # RAG - KNOWLEDGE BASE ENDPOINTS
 # =====================================================
 
+@app.on_event("shutdown")
+async def shutdown_executor():
+    chat_executor.shutdown()
+    await close_clients()
+    stop_api_logging()
+
+
+@app.on_event("startup")
+async def startup_api_logging():
+    """Start this worker's API log listener thread."""
+    configure_api_logging()
+
+
+@app.on_event("startup")
+async def startup_embedding_warmup():
+    """Warm the embedding model off the request path."""
+    if EMBEDDING_WARMUP_ON_STARTUP or EMBEDDING_PRELOAD:
+        start_background_warmup()
+
+
+@app.on_event("startup")
+async def startup_pincode_cache():
+    """Load the persisted / bulk pincode cache before the first quote."""
+    try:
+        get_pincode_cache()
+    except Exception as e:
+        logger.error(f"Pincode cache load failed: {e}")
+
+
 @app.on_event("startup")
 async def startup_ingest():
     """Auto-ingest documents from knowledge_base/ on server start."""
@@ -1471,6 +1899,11 @@ async def startup_ingest():
     except Exception as e:
         logger.error(f"Startup ingestion failed: {e}")
 
+    try:
+        warm_retrieval_backend()
+    except Exception as e:
+        logger.error(f"Retrieval index load failed: {e}")
+
 
 @app.post("/rag/ingest")
 async def rag_ingest(force: bool = False):
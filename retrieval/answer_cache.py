@@ -0,0 +1,146 @@
+"""
+Answer Cache
+Semantic cache of knowledge-base answers from the LLM fallback.
+
+A question is embedded with the same MiniLM model as retrieval (through the
+query-embedding LRU) and compared against the questions already answered;
+the best prior answer at or above ANSWER_CACHE_SIMILARITY is returned
+without calling the LLM.
+
+Entries are partitioned by scope (the caller's prompt-dependent inputs,
+e.g. the user name) and by the module the question names, so "spot rate
+request" never answers "rate request" however close the embeddings are.
+The whole cache is dropped when the knowledge-base version changes.
+"""
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from core.phrase_matcher import get_source_matcher
+from retrieval.vector_store import get_kb_version
+from retrieval.embedding_manager import embed_query, normalize_query
+from retrieval.rag_config import (
+    ANSWER_CACHE_SIZE,
+    ANSWER_CACHE_TTL_SECONDS,
+    ANSWER_CACHE_SIMILARITY,
+)
+
+
+def _partition(scope: str, question: str) -> tuple:
+    match = get_source_matcher().match(question)
+    return (scope, match.name if match else None)
+
+
+class SemanticAnswerCache:
+
+    def __init__(self, maxsize: int, ttl: float | None, threshold: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        # normalized question -> (expires_at | None, partition, embedding, answer)
+        self._data: OrderedDict = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_version(self, version: str):
+        # caller holds the lock
+        if version != self._version:
+            if self._data:
+                self.invalidations += 1
+            self._data.clear()
+            self._version = version
+
+    def get(self, question: str, scope: str = "") -> tuple[str, float] | None:
+        """(answer, similarity) of the closest cached question, or None."""
+        key = normalize_query(question)
+        partition = _partition(scope, key)
+        embedding = np.asarray(embed_query(question), dtype=np.float32)
+        now = time.time()
+
+        with self._lock:
+            self._check_version(get_kb_version())
+
+            expired = [k for k, (expires_at, *_) in self._data.items()
+                       if expires_at is not None and expires_at <= now]
+            for k in expired:
+                del self._data[k]
+
+            candidates = [(k, entry) for k, entry in self._data.items() if entry[1] == partition]
+            if candidates:
+                matrix = np.stack([entry[2] for _, entry in candidates])
+                similarities = matrix @ embedding
+                best = int(np.argmax(similarities))
+                similarity = float(similarities[best])
+                if similarity >= self.threshold:
+                    best_key, entry = candidates[best]
+                    self._data.move_to_end(best_key)
+                    self.hits += 1
+                    return entry[3], similarity
+
+            self.misses += 1
+            return None
+
+    def set(self, question: str, answer: str, scope: str = "", kb_version: str | None = None):
+        """
+        Cache answer for question. kb_version is the version the answer was
+        generated against; answers from a since-replaced KB are dropped.
+        """
+        key = normalize_query(question)
+        partition = _partition(scope, key)
+        embedding = np.asarray(embed_query(question), dtype=np.float32)
+        expires_at = time.time() + self.ttl if self.ttl else None
+
+        with self._lock:
+            self._check_version(get_kb_version())
+            if kb_version is not None and kb_version != self._version:
+                return
+            self._data[key] = (expires_at, partition, embedding, answer)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+_answer_cache = SemanticAnswerCache(
+    maxsize=ANSWER_CACHE_SIZE,
+    ttl=ANSWER_CACHE_TTL_SECONDS,
+    threshold=ANSWER_CACHE_SIMILARITY,
+)
+
+
+def lookup_answer(question: str, scope: str = "") -> tuple[str, float] | None:
+    if ANSWER_CACHE_SIZE <= 0:
+        return None
+    return _answer_cache.get(question, scope)
+
+
+def store_answer(question: str, answer: str, scope: str = "", kb_version: str | None = None):
+    if ANSWER_CACHE_SIZE <= 0 or not answer:
+        return
+    _answer_cache.set(question, answer, scope, kb_version)
+
+
+def get_answer_cache_stats() -> dict:
+    return _answer_cache.stats()
@@ -0,0 +1,130 @@
+"""
+Context Packer
+Assembles retrieved chunks into the knowledge-base context block under an
+explicit token budget.
+
+- Chunks are taken greedily by score; a chunk that does not fit is skipped
+  and smaller lower-scored ones may still go in.
+- Neighbouring chunks of one document (consecutive chunk_index) are merged
+  into one passage when they share the splitter's CHUNK_OVERLAP text, which
+  is dropped once; other chunks stay separate passages.
+- Each document gets one "=== DOCUMENT: ... ===" header, documents ordered
+  by their best chunk.
+
+Token counts are estimates (see estimate_tokens): the Groq tokenizer is
+not available locally, and the budget only needs to be roughly right.
+"""
+import math
+from typing import NamedTuple
+from retrieval.rag_config import CHUNK_OVERLAP
+
+# Average characters per token for English prose under Llama-style BPE
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+class PackedContext(NamedTuple):
+    text: str
+    tokens: int
+    chunks_used: int
+    chunks_dropped: int
+
+
+# Shorter prefix/suffix matches are coincidence, not splitter overlap
+MIN_OVERLAP_CHARS = 16
+
+
+def _is_boundary(text: str, i: int) -> bool:
+    """True if position i of text is not inside a word."""
+    return i <= 0 or i >= len(text) or not (text[i - 1].isalnum() and text[i].isalnum())
+
+
+def _overlap(previous: str, following: str) -> int:
+    """
+    Length of the CHUNK_OVERLAP text following repeats from the end of
+    previous, or 0. The splitter overlaps whole words, so a match must be
+    at least MIN_OVERLAP_CHARS long and start and end on word boundaries.
+    """
+    for size in range(min(len(previous), len(following), CHUNK_OVERLAP), MIN_OVERLAP_CHARS - 1, -1):
+        if (previous.endswith(following[:size])
+                and _is_boundary(previous, len(previous) - size)
+                and _is_boundary(following, size)):
+            return size
+    return 0
+
+
+def _doc_name(source: str) -> str:
+    return source.replace(".txt", "").replace("_", " ")
+
+
+def _header(source: str, avg_score: float) -> str:
+    return f"=== DOCUMENT: {_doc_name(source)} (Relevance: {avg_score}) ==="
+
+
+def _merge(chunks: list[dict]) -> list[str]:
+    """
+    Passages for one document: consecutive chunks that really overlap are
+    joined with the repeated text dropped; anything else stays a separate
+    passage.
+    """
+    passages = []
+    previous = None
+    for chunk in sorted(chunks, key=lambda c: c["chunk_index"] if c.get("chunk_index") is not None else -1):
+        index = chunk.get("chunk_index")
+        overlap = 0
+        if (previous is not None and index is not None
+                and previous.get("chunk_index") is not None
+                and index == previous["chunk_index"] + 1):
+            overlap = _overlap(previous["text"], chunk["text"])
+        if overlap:
+            passages[-1] += chunk["text"][overlap:]
+        else:
+            passages.append(chunk["text"])
+        previous = chunk
+    return passages
+
+
+def _render(chunks: list[dict]) -> str:
+    """Context block for chunks (best first): one section per document."""
+    by_source: dict[str, list[dict]] = {}
+    for chunk in chunks:
+        by_source.setdefault(chunk["source"], []).append(chunk)
+
+    context_parts = []
+    for source, group in by_source.items():
+        avg_score = round(sum(c["score"] for c in group) / len(group), 4)
+        context_parts.append("\n\n".join([_header(source, avg_score), *_merge(group)]))
+    return "\n\n" + "\n\n".join(context_parts)
+
+
+def pack_context(results: list[dict], budget_tokens: int) -> PackedContext:
+    """
+    results: retrieve() output ({"text", "source", "score", "chunk_index"}).
+    budget_tokens <= 0 packs everything. Each candidate is costed by
+    rendering the block with it, so the budget holds for the exact text
+    returned.
+    """
+    seen_texts = set()
+    candidates = []
+    for r in sorted(results, key=lambda r: r["score"], reverse=True):
+        text_key = r["text"][:100]
+        if text_key in seen_texts:
+            continue
+        seen_texts.add(text_key)
+        candidates.append(r)
+
+    selected = []
+    for r in candidates:
+        trial = selected + [r]
+        if budget_tokens > 0 and estimate_tokens(_render(trial)) > budget_tokens:
+            continue
+        selected = trial
+
+    if not selected:
+        return PackedContext("", 0, 0, len(candidates))
+
+    text = _render(selected)
+    return PackedContext(text, estimate_tokens(text), len(selected), len(candidates) - len(selected))
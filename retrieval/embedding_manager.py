@@ -1,27 +1,168 @@
 """
 Embedding Manager
 Manages the sentence-transformer embedding model (singleton pattern).
+
+Lifecycle:
+- preload_model() loads the weights only; used in the parent process
+  before workers fork, so they share the weights copy-on-write.
+- start_background_warmup() loads the model (if needed) and runs one
+  encode in a daemon thread, so the first query does not pay for it.
+- is_model_ready() / get_model_status() back the /health endpoint.
+
+Query embeddings are memoized in an LRU keyed on (model name, normalized
+query), so repeated questions skip the forward pass.
 """
+import gc
+import logging
+import re
+import threading
+import time
 from sentence_transformers import SentenceTransformer
-from retrieval.rag_config import EMBEDDING_MODEL_NAME
+from core.cache import TTLCache, MISSING
+from retrieval.rag_config import EMBEDDING_MODEL_NAME, QUERY_EMBEDDING_CACHE_SIZE
+
+logger = logging.getLogger("photon.embedding")
 
 _model = None
+_model_lock = threading.Lock()
+_ready = threading.Event()
+_status = {
+    "state": "not_loaded",  # not_loaded | loading | loaded | ready | error
+    "load_seconds": None,
+    "error": None,
+}
+_warmup_thread = None
+
+_query_cache = TTLCache(maxsize=QUERY_EMBEDDING_CACHE_SIZE)
+_WHITESPACE = re.compile(r"\s+")
 
 
 def get_embedding_model() -> SentenceTransformer:
     global _model
     if _model is None:
-        _model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+        with _model_lock:
+            if _model is None:
+                _status["state"] = "loading"
+                started = time.perf_counter()
+                try:
+                    model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+                except Exception as e:
+                    _status.update(state="error", error=str(e))
+                    raise
+                _status.update(
+                    state="loaded",
+                    load_seconds=round(time.perf_counter() - started, 2),
+                    error=None,
+                )
+                _model = model
     return _model
 
 
+def preload_model():
+    """
+    Load the weights without running inference, then move every object
+    allocated so far to the permanent GC generation so that collections in
+    forked workers do not touch (and copy) the parent's pages. Inference is
+    left to the workers: initializing torch thread pools before fork is
+    unsafe.
+    """
+    get_embedding_model()
+    gc.freeze()
+
+
+def warm_up():
+    """Load the model and run one encode so the first real query is fast."""
+    model = get_embedding_model()
+    model.encode("warm up", normalize_embeddings=True)
+    _status["state"] = "ready"
+    _ready.set()
+
+
+def _warm_up_safely():
+    try:
+        warm_up()
+        logger.info(f"Embedding model ready ({EMBEDDING_MODEL_NAME})")
+    except Exception as e:
+        _status.update(state="error", error=str(e))
+        logger.error(f"Embedding model warm-up failed: {e}")
+
+
+def start_background_warmup() -> threading.Thread:
+    global _warmup_thread
+    with _model_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(
+                target=_warm_up_safely,
+                name="embedding-warmup",
+                daemon=True,
+            )
+            _warmup_thread.start()
+    return _warmup_thread
+
+
+def is_model_ready() -> bool:
+    return _ready.is_set()
+
+
+def get_model_status() -> dict:
+    return {
+        "model": EMBEDDING_MODEL_NAME,
+        "ready": is_model_ready(),
+        **_status,
+    }
+
+
 def embed_texts(texts: list[str]) -> list[list[float]]:
     model = get_embedding_model()
     embeddings = model.encode(texts, show_progress_bar=False, normalize_embeddings=True)
     return embeddings.tolist()
 
 
+def normalize_query(query: str) -> str:
+    return _WHITESPACE.sub(" ", query).strip().lower()
+
+
 def embed_query(query: str) -> list[float]:
+    if QUERY_EMBEDDING_CACHE_SIZE <= 0:
+        return get_embedding_model().encode(query, normalize_embeddings=True).tolist()
+
+    key = (EMBEDDING_MODEL_NAME, normalize_query(query))
+    cached = _query_cache.get(key)
+    if cached is not MISSING:
+        return list(cached)
+
     model = get_embedding_model()
-    embedding = model.encode(query, normalize_embeddings=True)
-    return embedding.tolist()
+    embedding = model.encode(key[1], normalize_embeddings=True).tolist()
+    # stored as a tuple so callers cannot mutate the cached vector
+    _query_cache.set(key, tuple(embedding))
+    return embedding
+
+
+def embed_queries(queries: list[str]) -> list[list[float]]:
+    """Batch version of embed_query: cache misses go through one encode call."""
+    if QUERY_EMBEDDING_CACHE_SIZE <= 0:
+        if not queries:
+            return []
+        return get_embedding_model().encode(
+            queries, show_progress_bar=False, normalize_embeddings=True
+        ).tolist()
+
+    keys = [(EMBEDDING_MODEL_NAME, normalize_query(q)) for q in queries]
+    embeddings = [_query_cache.get(key) for key in keys]
+
+    # unique misses, in first-seen order
+    missing = list(dict.fromkeys(key for key, e in zip(keys, embeddings) if e is MISSING))
+    if missing:
+        encoded = get_embedding_model().encode(
+            [key[1] for key in missing], show_progress_bar=False, normalize_embeddings=True
+        ).tolist()
+        fresh = dict(zip(missing, encoded))
+        for key, embedding in fresh.items():
+            _query_cache.set(key, tuple(embedding))
+        embeddings = [fresh[key] if e is MISSING else e for key, e in zip(keys, embeddings)]
+
+    return [list(e) for e in embeddings]
+
+
+def get_query_cache_stats() -> dict:
+    return _query_cache.stats()
@@ -0,0 +1,111 @@
+"""
+NumPy Index
+In-memory exact vector index over the knowledge-base chunks.
+
+The normalized embeddings are held in one contiguous float32 matrix, so a
+query is a single matrix-vector product plus argpartition for the top-k.
+The index is loaded from the Chroma collection (which stays the source of
+truth) and reloaded whenever the knowledge-base version changes.
+"""
+import threading
+import numpy as np
+from retrieval.vector_store import get_collection, get_kb_version
+
+
+class NumpyIndex:
+
+    def __init__(self, ids: list[str], documents: list[str], metadatas: list[dict],
+                 embeddings, version: str):
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self.version = version
+        self._row_sets: dict = {}  # frozen where-clause -> row indices
+
+    @classmethod
+    def from_chroma(cls) -> "NumpyIndex":
+        # read the version first: a concurrent ingest then just triggers one more reload
+        version = get_kb_version()
+        results = get_collection().get(include=["embeddings", "documents", "metadatas"])
+        return cls(
+            ids=list(results["ids"]),
+            documents=list(results["documents"]),
+            metadatas=list(results["metadatas"]),
+            embeddings=results["embeddings"] if len(results["ids"]) else np.empty((0, 0), np.float32),
+            version=version,
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _rows(self, where: dict):
+        """Row indices whose metadata equals every key/value in where."""
+        key = frozenset(where.items())
+        rows = self._row_sets.get(key)
+        if rows is None:
+            rows = np.array(
+                [i for i, meta in enumerate(self.metadatas)
+                 if all((meta or {}).get(k) == v for k, v in where.items())],
+                dtype=np.intp,
+            )
+            self._row_sets[key] = rows
+        return rows
+
+    def search(self, query_embedding, n_results: int,
+               where: dict | None = None) -> list[tuple[str, dict, float]]:
+        return self.search_many([query_embedding], n_results, where)[0]
+
+    def search_many(self, query_embeddings, n_results: int,
+                    where: dict | None = None) -> list[list[tuple[str, dict, float]]]:
+        """
+        Exact top-n by cosine similarity for each query (embeddings are
+        normalized, so the dot product is the cosine), computed with one
+        matrix product. where restricts the search to chunks whose metadata
+        matches exactly, like Chroma's simple equality filter. Returns
+        (document, metadata, distance) tuples per query, best first, with
+        Chroma's cosine distance (1 - similarity).
+        """
+        if where:
+            rows = self._rows(where)
+            matrix = self.matrix[rows]
+        else:
+            rows = None
+            matrix = self.matrix
+
+        n = len(matrix)
+        if n == 0 or n_results <= 0:
+            return [[] for _ in query_embeddings]
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        similarities = queries @ matrix.T  # (queries, chunks)
+
+        if n_results < n:
+            top = np.argpartition(-similarities, n_results - 1, axis=1)[:, :n_results]
+        else:
+            top = np.broadcast_to(np.arange(n), (len(queries), n))
+
+        results = []
+        for row, candidates in zip(similarities, top):
+            candidates = candidates[np.argsort(-row[candidates], kind="stable")]
+            chunk_ids = rows[candidates] if rows is not None else candidates
+            results.append([
+                (self.documents[i], self.metadatas[i], float(1.0 - row[c]))
+                for i, c in zip(chunk_ids, candidates)
+            ])
+        return results
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_numpy_index() -> NumpyIndex:
+    """Current index, reloaded from Chroma if the knowledge base changed."""
+    global _index
+    version = get_kb_version()
+    if _index is None or _index.version != version:
+        with _index_lock:
+            if _index is None or _index.version != version:
+                _index = NumpyIndex.from_chroma()
+    return _index
@@ -3,6 +3,10 @@ RAG Configuration
 Centralized settings for the Retrieval-Augmented Generation pipeline.
 """
 import os
+from dotenv import load_dotenv
+
+# values below may come from .env; load it before they are read
+load_dotenv()
 
 # =====================================================
 # PATHS
@@ -15,6 +19,13 @@ CHROMA_PERSIST_DIR = os.path.join(BASE_DIR, "vector_store", "chroma_db")
 # EMBEDDING MODEL
 # =====================================================
 EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+# Load and warm the model in a background thread at startup
+EMBEDDING_WARMUP_ON_STARTUP = os.getenv("PHOTON_EMBEDDING_WARMUP", "true").lower() == "true"
+# Load the model when main is imported, i.e. in the parent process under
+# `gunicorn --preload`, so forked workers share the weights copy-on-write
+EMBEDDING_PRELOAD = os.getenv("PHOTON_PRELOAD_MODEL", "false").lower() == "true"
+# LRU of query embeddings keyed on (model, normalized query); 0 disables it
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("PHOTON_QUERY_EMBEDDING_CACHE_SIZE", "1024"))
 
 # =====================================================
 # CHUNKING
@@ -30,8 +41,31 @@ COLLECTION_NAME = "photon_knowledge"
 # =====================================================
 # RETRIEVAL
 # =====================================================
+# "chroma" queries the persistent HNSW index; "numpy" keeps an exact
+# in-memory copy of the embeddings (see retrieval/numpy_index.py)
+RETRIEVAL_BACKEND = os.getenv("PHOTON_RETRIEVAL_BACKEND", "chroma").lower()
 TOP_K_RESULTS = 8
 SIMILARITY_THRESHOLD = 0.35
+# When a query names a module, fetch top_k chunks filtered to that source
+# plus this many unfiltered ones, instead of over-fetching top_k * 3
+SOURCE_AWARE_RETRIEVAL = os.getenv("PHOTON_SOURCE_AWARE_RETRIEVAL", "true").lower() == "true"
+SOURCE_AWARE_UNFILTERED_K = int(os.getenv("PHOTON_SOURCE_AWARE_UNFILTERED_K", "4"))
+# Token budget of the knowledge-base context block (see
+# retrieval/context_packer.py); 0 packs every retrieved chunk
+RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv("PHOTON_RAG_CONTEXT_TOKEN_BUDGET", "1000"))
+# build_context results keyed on (normalized query, top_k, KB version); 0 disables
+RAG_CONTEXT_CACHE_SIZE = int(os.getenv("PHOTON_RAG_CONTEXT_CACHE_SIZE", "512"))
+# Touched on every collection change so all workers see the new KB version
+KB_VERSION_FILE = os.path.join(CHROMA_PERSIST_DIR, "kb_version")
+
+# =====================================================
+# ANSWER CACHE
+# =====================================================
+# Semantic cache of knowledge-base answers (see retrieval/answer_cache.py); 0 disables
+ANSWER_CACHE_SIZE = int(os.getenv("PHOTON_ANSWER_CACHE_SIZE", "256"))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("PHOTON_ANSWER_CACHE_TTL", "21600"))
+# Cosine similarity a new question needs to reuse a cached answer
+ANSWER_CACHE_SIMILARITY = float(os.getenv("PHOTON_ANSWER_CACHE_SIMILARITY", "0.95"))
 
 # =====================================================
 # SUPPORTED FILE TYPES
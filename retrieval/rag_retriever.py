@@ -2,74 +2,104 @@
 RAG Retriever
 Queries the ChromaDB vector store and returns relevant context chunks.
 Includes source-boost logic to prioritize exact document matches.
+Contexts are packed to a token budget and cached per knowledge-base version.
 """
 import os
-from retrieval.vector_store import get_collection
-from retrieval.embedding_manager import embed_query
-from retrieval.rag_config import TOP_K_RESULTS, SIMILARITY_THRESHOLD
+from core.cache import TTLCache, MISSING
+from core.phrase_matcher import get_source_matcher
+from retrieval.vector_store import get_collection, get_kb_version
+from retrieval.embedding_manager import embed_query, embed_queries, normalize_query
+from retrieval.numpy_index import get_numpy_index
+from retrieval.context_packer import pack_context
+from retrieval.rag_config import (
+    RETRIEVAL_BACKEND,
+    TOP_K_RESULTS,
+    SIMILARITY_THRESHOLD,
+    RAG_CONTEXT_CACHE_SIZE,
+    RAG_CONTEXT_TOKEN_BUDGET,
+    SOURCE_AWARE_RETRIEVAL,
+    SOURCE_AWARE_UNFILTERED_K,
+)
+
+# Entries for older KB versions are never hit again and age out of the LRU
+_context_cache = TTLCache(maxsize=RAG_CONTEXT_CACHE_SIZE)
 
 
 def _detect_target_source(query: str) -> str | None:
     """
     Detect if the user is asking about a specific known document/module.
     Returns the expected source filename or None.
+    Phrases are in the "sources" table of core/intent_phrases.json, most
+    specific document first.
     """
-    q = query.lower().strip()
-
-    # Order matters: check more specific names first
-    source_map = [
-        (["spot rate request", "spot rate", "spot request"], "Spot Rate Request.txt"),
-        (["rate request", "rate shopping"], "Rate Request.txt"),
-        (["dashboard", "analytics dashboard", "logistics dashboard"], "Dashboard.txt"),
-        (["report module", "report", "reports"], "Report_Module.txt"),
-        (["shipment module", "ship a box", "mass shipping", "sap shipping"], "Shipment_Module.txt"),
-        (["get quote", "quote module"], "Get Quote.txt"),
+    match = get_source_matcher().match(query)
+    return match.name if match else None
+
+
+def _search_many(query_embeddings, n_results: int,
+                 where: dict | None = None) -> list[list[tuple[str, dict, float]]]:
+    """Nearest chunks per query as (document, metadata, cosine distance), best first."""
+    if RETRIEVAL_BACKEND == "numpy":
+        return get_numpy_index().search_many(query_embeddings, n_results, where=where)
+
+    results = get_collection().query(
+        query_embeddings=list(query_embeddings),
+        n_results=n_results,
+        where=where,
+        include=["documents", "metadatas", "distances"],
+    )
+    if not results or not results["documents"]:
+        return [[] for _ in query_embeddings]
+    return [
+        list(zip(docs, metas, distances))
+        for docs, metas, distances in zip(
+            results["documents"],
+            results["metadatas"],
+            results["distances"],
+        )
     ]
 
-    for phrases, source_file in source_map:
-        for phrase in phrases:
-            if phrase in q:
-                return source_file
-    return None
 
+def _index_size() -> int:
+    if RETRIEVAL_BACKEND == "numpy":
+        return len(get_numpy_index())
+    return get_collection().count()
 
-def retrieve(query: str, top_k: int = TOP_K_RESULTS) -> list[dict]:
-    """
-    Perform semantic search against the vector store.
-    If user is asking about a specific module, boost chunks from that source.
 
-    Returns list of:
-      { "text": str, "source": str, "score": float }
+def _gather_candidates(query_embeddings, targets: list[str | None], top_k: int,
+                       total: int) -> list[list[tuple[str, dict, float]]]:
+    """
+    Run the vector queries for a batch. Queries without a target source
+    over-fetch top_k * 3 so the boost has room to work. With source-aware
+    retrieval, queries naming a module instead get a query filtered to
+    that source plus a small unfiltered one for related chunks.
     """
-    collection = get_collection()
+    candidates = [[] for _ in query_embeddings]
 
-    if collection.count() == 0:
-        return []
+    def run(indices, n_results, where=None):
+        if not indices:
+            return
+        found = _search_many([query_embeddings[i] for i in indices], min(n_results, total), where)
+        for i, rows in zip(indices, found):
+            candidates[i].extend(rows)
 
-    query_embedding = embed_query(query)
+    if not SOURCE_AWARE_RETRIEVAL:
+        run(range(len(query_embeddings)), top_k * 3)
+        return candidates
 
-    # Fetch more results to allow source-boosting to work
-    fetch_count = min(top_k * 3, collection.count())
+    run([i for i, t in enumerate(targets) if t is None], top_k * 3)
+    run([i for i, t in enumerate(targets) if t is not None], SOURCE_AWARE_UNFILTERED_K)
+    for target in dict.fromkeys(t for t in targets if t is not None):
+        run([i for i, t in enumerate(targets) if t == target], top_k, where={"source": target})
+    return candidates
 
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=fetch_count,
-        include=["documents", "metadatas", "distances"],
-    )
 
+def _score_candidates(candidates, top_k: int, target_source: str | None) -> list[dict]:
+    """Dedupe, threshold and source-boost search candidates."""
     retrieved = []
     seen_texts = set()
 
-    if not results or not results["documents"] or not results["documents"][0]:
-        return []
-
-    target_source = _detect_target_source(query)
-
-    for doc, meta, distance in zip(
-        results["documents"][0],
-        results["metadatas"][0],
-        results["distances"][0],
-    ):
+    for doc, meta, distance in candidates:
         # Deduplicate identical chunks
         text_key = doc[:120]
         if text_key in seen_texts:
@@ -95,6 +125,7 @@ def retrieve(query: str, top_k: int = TOP_K_RESULTS) -> list[dict]:
             "text": doc,
             "source": source,
             "score": round(score, 4),
+            "chunk_index": meta.get("chunk_index"),
         })
 
     retrieved.sort(key=lambda x: x["score"], reverse=True)
@@ -102,38 +133,79 @@ def retrieve(query: str, top_k: int = TOP_K_RESULTS) -> list[dict]:
     return retrieved[:top_k]
 
 
+def _retrieve(queries: list[str], query_embeddings, top_k: int, total: int) -> list[list[dict]]:
+    targets = [_detect_target_source(q) for q in queries]
+    candidates = _gather_candidates(query_embeddings, targets, top_k, total)
+
+    return [
+        _score_candidates(rows, top_k, target)
+        for rows, target in zip(candidates, targets)
+    ]
+
+
+def retrieve(query: str, top_k: int = TOP_K_RESULTS) -> list[dict]:
+    """
+    Perform semantic search against the vector store.
+    If user is asking about a specific module, boost chunks from that source.
+
+    Returns list of:
+      { "text": str, "source": str, "score": float, "chunk_index": int | None }
+    """
+    total = _index_size()
+
+    if total == 0:
+        return []
+
+    return _retrieve([query], [embed_query(query)], top_k, total)[0]
+
+
+def retrieve_many(queries: list[str], top_k: int = TOP_K_RESULTS) -> list[list[dict]]:
+    """
+    retrieve() for several queries at once: one batched encode and one
+    multi-embedding vector query. Results are in the same order as queries
+    and have the same threshold / source-boost semantics.
+    """
+    if not queries:
+        return []
+    total = _index_size()
+
+    if total == 0:
+        return [[] for _ in queries]
+
+    return _retrieve(queries, embed_queries(queries), top_k, total)
+
+
+def warm_retrieval_backend():
+    """Load the in-memory index ahead of the first query (numpy backend only)."""
+    if RETRIEVAL_BACKEND == "numpy":
+        get_numpy_index()
+
+
 def build_context(query: str, top_k: int = TOP_K_RESULTS) -> str:
     """
-    Retrieve relevant chunks, group by source document, and format
-    as a structured context block for LLM injection.
+    Retrieve relevant chunks and pack them, grouped by source document,
+    into a context block of at most RAG_CONTEXT_TOKEN_BUDGET tokens.
     Returns empty string if no relevant context found.
     """
-    results = retrieve(query, top_k)
+    if RAG_CONTEXT_CACHE_SIZE <= 0:
+        return _build_context(query, top_k)
 
-    if not results:
-        return ""
+    key = (normalize_query(query), top_k, get_kb_version())
+    context = _context_cache.get(key)
+    if context is MISSING:
+        context = _build_context(query, top_k)
+        _context_cache.set(key, context)
+    return context
 
-    # Group chunks by source document
-    source_groups: dict[str, list[dict]] = {}
-    seen_texts = set()
 
-    for r in results:
-        text_key = r["text"][:100]
-        if text_key in seen_texts:
-            continue
-        seen_texts.add(text_key)
+def get_context_cache_stats() -> dict:
+    return _context_cache.stats()
+
 
-        source = r["source"]
-        source_groups.setdefault(source, []).append(r)
+def _build_context(query: str, top_k: int) -> str:
+    results = retrieve(query, top_k)
 
-    # Build context with clear document separation
-    context_parts = []
-    for source, chunks in source_groups.items():
-        doc_name = source.replace(".txt", "").replace("_", " ")
-        avg_score = round(sum(c["score"] for c in chunks) / len(chunks), 4)
-        section = f"=== DOCUMENT: {doc_name} (Relevance: {avg_score}) ==="
-        for chunk in chunks:
-            section += f"\n{chunk['text']}"
-        context_parts.append(section)
+    if not results:
+        return ""
 
-    return "\n\n" + "\n\n".join(context_parts)
+    return pack_context(results, RAG_CONTEXT_TOKEN_BUDGET).text
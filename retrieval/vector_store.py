@@ -2,10 +2,14 @@
 Vector Store
 ChromaDB-backed persistent vector store for document embeddings.
 Handles collection management, upserting, and deduplication via file hashes.
+
+Every change to the collection bumps a knowledge-base version stamp, which
+downstream caches include in their keys.
 """
 import os
+import uuid
 import chromadb
-from retrieval.rag_config import CHROMA_PERSIST_DIR, COLLECTION_NAME
+from retrieval.rag_config import CHROMA_PERSIST_DIR, COLLECTION_NAME, KB_VERSION_FILE
 from retrieval.embedding_manager import embed_texts
 
 _client = None
@@ -31,6 +35,27 @@ def get_collection():
     return _collection
 
 
+def get_kb_version() -> str:
+    """
+    Current knowledge-base version. The stamp file is replaced (new inode,
+    new mtime) on every bump, so a stat() is enough to notice changes made
+    by other worker processes.
+    """
+    try:
+        st = os.stat(KB_VERSION_FILE)
+    except FileNotFoundError:
+        return "0"
+    return f"{st.st_ino}:{st.st_mtime_ns}"
+
+
+def _bump_kb_version():
+    os.makedirs(CHROMA_PERSIST_DIR, exist_ok=True)
+    tmp_path = f"{KB_VERSION_FILE}.{uuid.uuid4().hex}"
+    with open(tmp_path, "w") as f:
+        f.write(uuid.uuid4().hex)
+    os.replace(tmp_path, KB_VERSION_FILE)
+
+
 def get_indexed_hashes() -> set:
     """Return set of file_hashes already stored in the collection."""
     collection = get_collection()
@@ -57,6 +82,7 @@ def remove_by_hash(file_hash: str):
     )
     if results["ids"]:
         collection.delete(ids=results["ids"])
+        _bump_kb_version()
 
 
 def upsert_chunks(chunks: list[dict]):
@@ -109,6 +135,8 @@ def upsert_chunks(chunks: list[dict]):
                 metadatas=metadatas[i:end],
             )
 
+    _bump_kb_version()
+
 
 def get_store_stats() -> dict:
     """Return basic stats about the vector store."""
@@ -0,0 +1,86 @@
+"""
+Address Directory
+Per-user cache of the AddressList results (ShipFrom warehouses and ShipTo
+addresses), indexed by addressId, postalCode and city so lookups need
+neither a list scan nor another fetch. Saving an address invalidates the
+user's ShipTo entry.
+"""
+from core.cache import TTLCache
+from services.service_config import ADDRESS_CACHE_TTL_SECONDS, ADDRESS_CACHE_MAX_USERS
+
+SHIP_FROM = "ShipFrom"
+SHIP_TO = "ShipTo"
+
+
+def _normalize_city(city) -> str:
+    return str(city or "").strip().lower()
+
+
+class AddressIndex:
+
+    def __init__(self, addresses: list[dict]):
+        self.addresses = addresses
+        self.by_id = {}
+        self.by_postal_code = {}
+        self.by_city = {}
+
+        for address in addresses:
+            self._index(address)
+
+    def _index(self, address: dict):
+        address_id = address.get("addressId")
+        if address_id is not None:
+            self.by_id[str(address_id)] = address
+
+        postal_code = str(address.get("postalCode") or "").strip()
+        if postal_code:
+            self.by_postal_code.setdefault(postal_code, []).append(address)
+
+        # first address of a city wins, matching the old list-scan behaviour
+        city = _normalize_city(address.get("city"))
+        if city:
+            self.by_city.setdefault(city, address)
+
+
+class AddressDirectory:
+
+    def __init__(self, ttl: int = ADDRESS_CACHE_TTL_SECONDS,
+                 max_users: int = ADDRESS_CACHE_MAX_USERS):
+        # two entries (ShipFrom + ShipTo) per user
+        self._cache = TTLCache(maxsize=max_users * 2, ttl=ttl)
+
+    def get(self, address_type: str, user_id) -> AddressIndex | None:
+        return self._cache.get((address_type, user_id), None)
+
+    def put(self, address_type: str, user_id, addresses: list[dict]) -> AddressIndex:
+        index = AddressIndex(addresses)
+        self._cache.set((address_type, user_id), index)
+        return index
+
+    def invalidate(self, address_type: str | None = None, user_id=None):
+        if address_type is None and user_id is None:
+            self._cache.clear()
+            return
+        for kind in ([address_type] if address_type else [SHIP_FROM, SHIP_TO]):
+            self._cache.delete((kind, user_id))
+
+    def find(self, address_type: str, user_id, address_id=None,
+             postal_code=None, city=None) -> dict | None:
+        index = self.get(address_type, user_id)
+        if index is None:
+            return None
+        if address_id is not None:
+            return index.by_id.get(str(address_id))
+        if postal_code:
+            matches = index.by_postal_code.get(str(postal_code).strip())
+            # newest address wins when several share a pincode
+            return matches[-1] if matches else None
+        if city:
+            return index.by_city.get(_normalize_city(city))
+        return None
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+address_directory = AddressDirectory()
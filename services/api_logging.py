@@ -0,0 +1,172 @@
+"""
+API Logging
+Structured, sampled, non-blocking logging for Photon API calls.
+
+- Records go through a QueueHandler; a background QueueListener thread
+  formats and writes them, so the request path never blocks on stdout.
+- Payloads and bodies are wrapped in LazyBody and only serialized (and
+  truncated) by the listener, and only when the level is enabled.
+- Per-endpoint sampling keeps chatty endpoints (labels, address lists)
+  from flooding the log.
+- The listener is per process: configure it in each worker (startup hook),
+  a forked child drops any setup inherited from its parent.
+"""
+import json
+import logging
+import os
+import random
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from services.service_config import (
+    API_LOG_LEVEL,
+    API_LOG_SAMPLE_RATES,
+    API_LOG_MAX_BODY_CHARS,
+    API_LOG_MAX_STRING_CHARS,
+    API_LOG_MAX_LIST_ITEMS,
+)
+
+logger = logging.getLogger("photon.api")
+
+_listener = None
+_handler = None
+_setup_lock = threading.Lock()
+
+
+def _shrink(value, depth=0):
+    """Copy of value with long strings and lists cut down for logging."""
+    if isinstance(value, str):
+        if len(value) > API_LOG_MAX_STRING_CHARS:
+            return f"{value[:API_LOG_MAX_STRING_CHARS]}...<{len(value)} chars>"
+        return value
+    if depth > 6:
+        return "..."
+    if isinstance(value, dict):
+        return {k: _shrink(v, depth + 1) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        items = [_shrink(v, depth + 1) for v in value[:API_LOG_MAX_LIST_ITEMS]]
+        if len(value) > API_LOG_MAX_LIST_ITEMS:
+            items.append(f"...<{len(value)} items>")
+        return items
+    return value
+
+
+class LazyBody:
+    """
+    Defers serialization until the record is actually formatted.
+    Accepts a value or a zero-argument callable producing the value.
+    """
+
+    __slots__ = ("_source",)
+
+    def __init__(self, source):
+        self._source = source
+
+    def render(self):
+        try:
+            value = self._source() if callable(self._source) else self._source
+        except Exception as e:
+            return f"<unavailable: {e}>"
+        value = _shrink(value)
+        text = value if isinstance(value, str) else json.dumps(value, default=str)
+        if len(text) > API_LOG_MAX_BODY_CHARS:
+            return f"{text[:API_LOG_MAX_BODY_CHARS]}...<truncated {len(text)} chars>"
+        return value
+
+
+class JsonLineFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, event and any fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+
+        body = getattr(record, "body", None)
+        if body is not None:
+            entry["body"] = body.render() if isinstance(body, LazyBody) else body
+
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    # The stock prepare() formats the record on the calling thread;
+    # pass it through untouched so formatting happens in the listener.
+    def prepare(self, record):
+        return record
+
+
+def configure_api_logging(level: str = API_LOG_LEVEL, stream=None):
+    """Install the queue handler and start the listener thread (idempotent)."""
+    global _listener, _handler
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(JsonLineFormatter())
+
+        queue = SimpleQueue()
+        _listener = QueueListener(queue, output, respect_handler_level=False)
+        _listener.start()
+
+        _handler = _DeferredQueueHandler(queue)
+        logger.addHandler(_handler)
+        logger.setLevel(level)
+        logger.propagate = False
+
+
+def stop_api_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener, _handler
+    with _setup_lock:
+        if _listener is not None:
+            logger.removeHandler(_handler)
+            _listener.stop()
+            _listener = _handler = None
+
+
+def _reset_after_fork():
+    """
+    A forked child (gunicorn --preload worker) inherits _listener but not its
+    thread: records would pile up in a queue nobody drains. Drop the
+    inherited setup so configure_api_logging() starts a fresh listener.
+    """
+    global _listener, _handler, _setup_lock
+    _setup_lock = threading.Lock()
+    if _handler is not None:
+        logger.removeHandler(_handler)
+    _listener = _handler = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def should_sample(endpoint: str) -> bool:
+    rate = API_LOG_SAMPLE_RATES.get(endpoint, API_LOG_SAMPLE_RATES.get("default", 1.0))
+    return rate >= 1.0 or random.random() < rate
+
+
+def log_event(event: str, data=None, level: int = logging.DEBUG, **fields):
+    """
+    Log a structured event. data may be a value or a callable; either way it
+    is only serialized if the record is emitted.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    logger.log(
+        level,
+        event,
+        extra={
+            "fields": fields,
+            "body": LazyBody(data) if data is not None else None,
+        },
+    )
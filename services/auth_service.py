@@ -1,13 +1,22 @@
 import os
-import requests
+import asyncio
 import base64
 import json
+import logging
+import time
 from dotenv import load_dotenv
+from core.cache import AsyncSingleflight
+from services import http_client
+from services.api_logging import log_event
+from services.http_client import run_sync, get_background_loop
+from services.service_config import (
+    BASE_URL,
+    TOKEN_EXPIRY_SKEW_SECONDS,
+    TOKEN_REFRESH_AHEAD_SECONDS,
+)
 
 load_dotenv()
 
-BASE_URL = "https://qaapi.shipphoton.com"
-
 USERNAME = os.getenv("EMAIL_ID")
 PASSWORD = os.getenv("password")
 
@@ -18,6 +27,13 @@ token_cache = {
     "expires": None
 }
 
+# Every login runs on the HTTP background loop under this singleflight,
+# so concurrent callers from any thread share exactly one GetToken call.
+_login_flight = AsyncSingleflight()
+_refresh_handle = None
+_token_used = False
+_details_fetched_for = None
+
 
 def decode_jwt(token):
     """
@@ -32,7 +48,9 @@ def decode_jwt(token):
         return {}
 
 
-def login():
+async def _do_login():
+    global _token_used, _details_fetched_for
+
     url = f"{BASE_URL}/api/Auth/GetToken"
 
     payload = {
@@ -43,18 +61,24 @@ def login():
         "os": "windows"
     }
 
-    response = requests.post(url, json=payload)
+    response = await http_client.request("POST", url, json=payload)
     response.raise_for_status()
 
     data = response.json()
     token = data["data"]["token"]
 
-    token_cache["token"] = token
-
     #  Decode token to extract userId
     decoded = decode_jwt(token)
 
-    token_cache["name"] = (
+    try:
+        token_cache["expires"] = float(decoded["exp"])
+    except (KeyError, TypeError, ValueError):
+        token_cache["expires"] = None
+
+    token_cache["token"] = token
+    _token_used = False
+
+    jwt_name = (
         decoded.get("name")
         or decoded.get("unique_name")
         or decoded.get("fullName")
@@ -75,27 +99,116 @@ def login():
     except Exception:
         token_cache["user_id"] = None
 
-    print("EXTRACTED USER ID:", token_cache["user_id"])
+    log_event("token_acquired", level=logging.INFO, user_id=token_cache["user_id"],
+              expires=token_cache["expires"])
 
-    #  Fetch actual full name from API
-    if token_cache["user_id"]:
-        full_name = fetch_user_details(token_cache["user_id"])
-        if full_name:
-            token_cache["name"] = full_name
+    #  Fetch actual full name from API (once per user, not on every refresh)
+    if token_cache["user_id"] != _details_fetched_for or not token_cache["name"]:
+        token_cache["name"] = jwt_name
+        if token_cache["user_id"]:
+            full_name = await async_fetch_user_details(token_cache["user_id"])
+            if full_name:
+                token_cache["name"] = full_name
+                _details_fetched_for = token_cache["user_id"]
 
+    _schedule_proactive_refresh()
     return token
 
 
-def get_headers():
+async def async_login():
+    """
+    Log in / refresh the token. Concurrent callers share one login.
+    """
+    loop = get_background_loop()
+    coro = _login_flight.do("login", _do_login)
+    if asyncio.get_running_loop() is loop:
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+
+def login():
+    return run_sync(async_login())
+
+
+async def async_refresh_token(stale_token=None):
+    """
+    Reactive refresh after a 401. If another caller already replaced
+    stale_token, the new token is reused instead of logging in again.
+    """
+    if stale_token and token_cache["token"] and token_cache["token"] != stale_token:
+        return token_cache["token"]
+    return await async_login()
+
+
+# =====================================================
+# TOKEN EXPIRY (JWT exp claim)
+# =====================================================
+
+def _needs_login():
+    expires = token_cache["expires"]
     if not token_cache["token"]:
-        login()
+        return True
+    return expires is not None and expires - time.time() <= TOKEN_EXPIRY_SKEW_SECONDS
+
 
+def _schedule_proactive_refresh():
+    # runs on the background loop (inside _do_login)
+    global _refresh_handle
+    if _refresh_handle is not None:
+        _refresh_handle.cancel()
+        _refresh_handle = None
+
+    expires = token_cache["expires"]
+    if expires is None:
+        return
+
+    delay = max(0.0, expires - time.time() - TOKEN_REFRESH_AHEAD_SECONDS)
+    _refresh_handle = asyncio.get_running_loop().call_later(delay, _proactive_refresh)
+
+
+def _proactive_refresh():
+    # An idle token is left to expire; the next request logs in on demand
+    if not _token_used:
+        return
+    asyncio.ensure_future(_background_login())
+
+
+async def _background_login():
+    try:
+        await _login_flight.do("login", _do_login)
+    except Exception as e:
+        log_event("token_refresh_error", level=logging.WARNING, error=str(e))
+
+
+def _auth_headers():
     return {
         "Authorization": f"Bearer {token_cache['token']}",
         "Content-Type": "application/json"
     }
 
 
+async def async_get_headers():
+    global _token_used
+    if _needs_login():
+        await async_login()
+    _token_used = True
+    return _auth_headers()
+
+
+def get_headers():
+    global _token_used
+    if _needs_login():
+        login()
+    _token_used = True
+    return _auth_headers()
+
+
+async def async_get_logged_user_id():
+    if token_cache["user_id"] is None:
+        await async_login()
+    return token_cache["user_id"]
+
+
 def get_logged_user_id():
     if token_cache["user_id"] is None:
         login()
@@ -106,7 +219,7 @@ def get_logged_user_name():
         login()
     return token_cache.get("name") or "User"
 
-def fetch_user_details(user_id):
+async def async_fetch_user_details(user_id):
     try:
         if not token_cache["token"]:
             return None
@@ -119,18 +232,21 @@ def fetch_user_details(user_id):
             "Content-Type": "application/json"
         }
 
-        response = requests.get(url, params=params, headers=headers)
+        response = await http_client.request("GET", url, params=params, headers=headers)
 
         if response.status_code != 200:
             return None
 
         data = response.json().get("data", {})
 
-        # Debug print (temporary)
-        print("USER DETAILS API RESPONSE:", data)
+        log_event("user_details", data, user_id=user_id)
 
         return data.get("fullName")
 
     except Exception as e:
-        print("FETCH USER ERROR:", e)
-        return None
\ No newline at end of file
+        log_event("fetch_user_error", level=logging.WARNING, user_id=user_id, error=str(e))
+        return None
+
+
+def fetch_user_details(user_id):
+    return run_sync(async_fetch_user_details(user_id))
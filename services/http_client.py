@@ -0,0 +1,100 @@
+"""
+HTTP Client
+Pooled keep-alive httpx clients for the Photon API.
+
+An AsyncClient is bound to the event loop it was created on, so there is
+one client per loop. Synchronous callers (the orchestrator worker threads)
+share a single background loop through run_sync(), which means they also
+share one connection pool instead of opening a TCP+TLS connection per call.
+"""
+import asyncio
+import threading
+import weakref
+import httpx
+from services.service_config import (
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_POOL_TIMEOUT,
+)
+
+_clients = weakref.WeakKeyDictionary()
+
+_background_loop = None
+_background_thread = None
+_background_lock = threading.Lock()
+
+
+def _new_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            HTTP_READ_TIMEOUT,
+            connect=HTTP_CONNECT_TIMEOUT,
+            pool=HTTP_POOL_TIMEOUT,
+        ),
+    )
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Pooled client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = _new_client()
+        _clients[loop] = client
+    return client
+
+
+async def request(method: str, url: str, **kwargs) -> httpx.Response:
+    return await get_async_client().request(method, url, **kwargs)
+
+
+# =====================================================
+# SYNC BRIDGE
+# =====================================================
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    global _background_loop, _background_thread
+    with _background_lock:
+        if _background_loop is None:
+            _background_loop = asyncio.new_event_loop()
+            _background_thread = threading.Thread(
+                target=_background_loop.run_forever,
+                name="photon-http",
+                daemon=True,
+            )
+            _background_thread.start()
+    return _background_loop
+
+
+def run_sync(coro):
+    """
+    Run a coroutine on the shared background loop and block for its result.
+    Must not be called from the background loop itself.
+    """
+    if threading.current_thread() is _background_thread:
+        coro.close()
+        raise RuntimeError("run_sync() called from the HTTP background loop; await instead")
+    return asyncio.run_coroutine_threadsafe(coro, get_background_loop()).result()
+
+
+async def close_clients():
+    """Close the running loop's client and the background loop's client."""
+    loop = asyncio.get_running_loop()
+    client = _clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
+
+    if _background_loop is not None and _background_loop is not loop:
+        background_client = _clients.pop(_background_loop, None)
+        if background_client is not None:
+            await asyncio.wrap_future(
+                asyncio.run_coroutine_threadsafe(background_client.aclose(), _background_loop)
+            )
@@ -0,0 +1,190 @@
+"""
+Pincode Cache
+Long-lived cache for GetPincodeDetails results.
+
+- Valid pincodes are kept for PINCODE_CACHE_TTL_SECONDS, invalid ones
+  (negative entries) for PINCODE_NEGATIVE_TTL_SECONDS.
+- Size is bounded by LRU eviction.
+- With PINCODE_CACHE_PATH set, entries are written behind to SQLite by a
+  writer thread, in batches, and reloaded on startup. Lookups run on the
+  HTTP event loop, so they never wait for a commit.
+- With PINCODE_PREWARM_FILE set, a bulk .csv / .json pincode file is
+  loaded at startup.
+"""
+import csv
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from core.cache import TTLCache
+from services.service_config import (
+    PINCODE_CACHE_TTL_SECONDS,
+    PINCODE_NEGATIVE_TTL_SECONDS,
+    PINCODE_CACHE_MAX_ENTRIES,
+    PINCODE_CACHE_PATH,
+    PINCODE_PREWARM_FILE,
+)
+
+logger = logging.getLogger("photon.pincode_cache")
+
+
+def _key(pincode, country) -> str:
+    return f"{str(country).upper()}:{str(pincode).strip()}"
+
+
+class PincodeCache:
+
+    def __init__(self, path: str = PINCODE_CACHE_PATH,
+                 maxsize: int = PINCODE_CACHE_MAX_ENTRIES,
+                 ttl: int = PINCODE_CACHE_TTL_SECONDS,
+                 negative_ttl: int = PINCODE_NEGATIVE_TTL_SECONDS):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._path = path
+        self._db = None
+        self._db_lock = threading.Lock()
+        # entries waiting for the writer thread
+        self._pending = []
+        self._pending_ready = threading.Condition()
+        self._writer = None
+
+        if path:
+            self._open_db()
+            self._load_persisted()
+
+    # ---------- persistence ----------
+
+    def _open_db(self):
+        os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(self._path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pincodes ("
+            " key TEXT PRIMARY KEY,"
+            " details TEXT,"
+            " expires_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def _load_persisted(self):
+        now = time.time()
+        with self._db_lock:
+            self._db.execute("DELETE FROM pincodes WHERE expires_at < ?", (now,))
+            self._db.commit()
+            rows = self._db.execute(
+                "SELECT key, details, expires_at FROM pincodes ORDER BY expires_at DESC LIMIT ?",
+                (self._cache.maxsize,),
+            ).fetchall()
+
+        # oldest first so the freshest entries end up most recently used
+        for key, details, expires_at in reversed(rows):
+            value = json.loads(details) if details else None
+            self._cache.set(key, value, ttl=expires_at - now)
+
+    def _persist(self, entries: list[tuple[str, dict | None, float]]):
+        if self._db is None or not entries:
+            return
+        now = time.time()
+        with self._db_lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO pincodes (key, details, expires_at) VALUES (?, ?, ?)",
+                [
+                    (key, json.dumps(details) if details else None, now + ttl)
+                    for key, details, ttl in entries
+                ],
+            )
+            self._db.commit()
+
+    def _persist_later(self, entries: list[tuple[str, dict | None, float]]):
+        if self._db is None or not entries:
+            return
+        with self._pending_ready:
+            self._pending.extend(entries)
+            # is_alive() is False in a forked child, which gets its own writer
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(
+                    target=self._write_pending, name="photon-pincode-writer", daemon=True,
+                )
+                self._writer.start()
+            self._pending_ready.notify()
+
+    def _write_pending(self):
+        while True:
+            with self._pending_ready:
+                while not self._pending:
+                    self._pending_ready.wait()
+                # everything queued while the previous batch committed
+                batch, self._pending = self._pending, []
+            try:
+                self._persist(batch)
+            except sqlite3.Error as e:
+                logger.warning("pincode cache write failed: %s", e)
+
+    # ---------- lookups ----------
+
+    def get(self, pincode, country="IN"):
+        """Cached details, None for a known-invalid pincode, MISSING if unknown."""
+        return self._cache.get(_key(pincode, country))
+
+    def put(self, pincode, country, details: dict | None):
+        """Cache details; None (or a result without a city) is cached as invalid."""
+        valid = bool(details and details.get("city"))
+        ttl = self.ttl if valid else self.negative_ttl
+        key = _key(pincode, country)
+        self._cache.set(key, details, ttl=ttl)
+        self._persist_later([(key, details, ttl)])
+
+    # ---------- bulk pre-warm ----------
+
+    def prewarm_from_file(self, path: str) -> int:
+        """
+        Load a bulk pincode file. Supported formats:
+          .csv  with columns pincode, city, state[, country]
+          .json list of {"pincode", "city", "state", "country"} objects
+        Returns the number of pincodes loaded.
+        """
+        if path.lower().endswith(".json"):
+            with open(path, "r", encoding="utf-8") as f:
+                rows = json.load(f)
+        else:
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                rows = list(csv.DictReader(f))
+
+        entries = []
+        for row in rows:
+            pincode = str(row.get("pincode") or "").strip()
+            if not pincode or not row.get("city"):
+                continue
+            country = row.get("country") or "IN"
+            details = {"city": row["city"], "state": row.get("state"), "country": country}
+            key = _key(pincode, country)
+            self._cache.set(key, details, ttl=self.ttl)
+            entries.append((key, details, self.ttl))
+
+        self._persist(entries)
+        return len(entries)
+
+    def stats(self) -> dict:
+        return {
+            **self._cache.stats(),
+            "persistent": self._db is not None,
+        }
+
+
+_pincode_cache = None
+_pincode_cache_lock = threading.Lock()
+
+
+def get_pincode_cache() -> PincodeCache:
+    global _pincode_cache
+    if _pincode_cache is None:
+        with _pincode_cache_lock:
+            if _pincode_cache is None:
+                cache = PincodeCache()
+                if PINCODE_PREWARM_FILE and os.path.isfile(PINCODE_PREWARM_FILE):
+                    cache.prewarm_from_file(PINCODE_PREWARM_FILE)
+                _pincode_cache = cache
+    return _pincode_cache
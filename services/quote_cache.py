@@ -0,0 +1,84 @@
+"""
+Quote Cache
+Short-lived cache for GetQuote results keyed on the normalized shipment
+parameters (pincodes, rounded weight and dimensions, units, ship date).
+
+Identical concurrent quote requests share one upstream call (singleflight).
+Only successful quotes are cached, for at most QUOTE_CACHE_TTL_SECONDS.
+"""
+from datetime import date
+from core.cache import TTLCache, AsyncSingleflight, MISSING
+from services.service_config import (
+    QUOTE_CACHE_TTL_SECONDS,
+    QUOTE_CACHE_MAX_ENTRIES,
+    QUOTE_KEY_PRECISION,
+)
+
+WEIGHT_UOM = "KG"
+LENGTH_UOM = "CM"
+
+
+def _round(value):
+    try:
+        return round(float(value), QUOTE_KEY_PRECISION)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def quote_key(from_pincode, to_pincode, weight, length, width, height) -> tuple:
+    return (
+        str(from_pincode).strip(),
+        str(to_pincode).strip(),
+        _round(weight),
+        _round(length),
+        _round(width),
+        _round(height),
+        WEIGHT_UOM,
+        LENGTH_UOM,
+        # rates are quoted per ship date, never reuse across midnight
+        date.today().isoformat(),
+    )
+
+
+class QuoteCache:
+
+    def __init__(self, ttl: int = QUOTE_CACHE_TTL_SECONDS,
+                 maxsize: int = QUOTE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._flights = AsyncSingleflight()
+        self.upstream_calls = 0
+
+    async def get_or_fetch(self, key: tuple, fetch):
+        """
+        Cached quote for key, or the result of `await fetch()`.
+        Results without statusCode 200 are returned but not cached.
+        """
+        if self.ttl > 0:
+            cached = self._cache.get(key)
+            if cached is not MISSING:
+                return dict(cached)
+
+        async def run():
+            self.upstream_calls += 1
+            result = await fetch()
+            if self.ttl > 0 and result.get("statusCode") == 200:
+                self._cache.set(key, result)
+            return result
+
+        result = await self._flights.do(key, run)
+        return dict(result)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return {
+            **self._cache.stats(),
+            "ttl_seconds": self.ttl,
+            "upstream_calls": self.upstream_calls,
+            "coalesced": self._flights.coalesced,
+        }
+
+
+quote_cache = QuoteCache()
@@ -0,0 +1,92 @@
+"""
+Service Configuration
+Centralized settings for the Photon API service layer.
+Every value can be overridden through an environment variable.
+"""
+import json
+import os
+from dotenv import load_dotenv
+
+# values below may come from .env; load it before they are read
+load_dotenv()
+
+# =====================================================
+# PHOTON API
+# =====================================================
+# Point at simulators/photon_server.py to run without the QA API
+BASE_URL = os.getenv("PHOTON_BASE_URL", "https://qaapi.shipphoton.com").rstrip("/")
+
+# =====================================================
+# HTTP CONNECTION POOL
+# =====================================================
+HTTP_MAX_CONNECTIONS = int(os.getenv("PHOTON_HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("PHOTON_HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("PHOTON_HTTP_KEEPALIVE_EXPIRY", "30"))
+
+# =====================================================
+# HTTP TIMEOUTS (seconds)
+# =====================================================
+HTTP_CONNECT_TIMEOUT = float(os.getenv("PHOTON_HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("PHOTON_HTTP_READ_TIMEOUT", "30"))
+HTTP_POOL_TIMEOUT = float(os.getenv("PHOTON_HTTP_POOL_TIMEOUT", "10"))
+
+# =====================================================
+# RECENT SHIPMENTS FAN-OUT
+# =====================================================
+# Max per-day ShipmentTracking requests in flight for date-range scans
+RECENT_SHIPMENTS_CONCURRENCY = int(os.getenv("PHOTON_RECENT_SHIPMENTS_CONCURRENCY", "8"))
+
+# =====================================================
+# PINCODE CACHE
+# =====================================================
+# Pincode -> city/state data almost never changes
+PINCODE_CACHE_TTL_SECONDS = int(os.getenv("PHOTON_PINCODE_CACHE_TTL", str(30 * 24 * 3600)))
+# Invalid / unserviceable pincodes are remembered for a shorter time
+PINCODE_NEGATIVE_TTL_SECONDS = int(os.getenv("PHOTON_PINCODE_NEGATIVE_TTL", str(24 * 3600)))
+PINCODE_CACHE_MAX_ENTRIES = int(os.getenv("PHOTON_PINCODE_CACHE_MAX_ENTRIES", "50000"))
+# Optional SQLite file so the cache survives restarts ("" = memory only)
+PINCODE_CACHE_PATH = os.getenv("PHOTON_PINCODE_CACHE_PATH", "")
+# Optional bulk file (.csv or .json) loaded into the cache at startup
+PINCODE_PREWARM_FILE = os.getenv("PHOTON_PINCODE_PREWARM_FILE", "")
+
+# =====================================================
+# ADDRESS DIRECTORY
+# =====================================================
+# Warehouse / ship-to lists are cached per user; saving an address invalidates
+ADDRESS_CACHE_TTL_SECONDS = int(os.getenv("PHOTON_ADDRESS_CACHE_TTL", "300"))
+ADDRESS_CACHE_MAX_USERS = int(os.getenv("PHOTON_ADDRESS_CACHE_MAX_USERS", "1000"))
+
+# =====================================================
+# QUOTE CACHE
+# =====================================================
+# Staleness window: carrier rates change intra-day, keep this short
+QUOTE_CACHE_TTL_SECONDS = int(os.getenv("PHOTON_QUOTE_CACHE_TTL", "300"))
+QUOTE_CACHE_MAX_ENTRIES = int(os.getenv("PHOTON_QUOTE_CACHE_MAX_ENTRIES", "2000"))
+# Weight (kg) and dimensions (cm) are rounded to this many decimals for the key
+QUOTE_KEY_PRECISION = int(os.getenv("PHOTON_QUOTE_KEY_PRECISION", "2"))
+
+# =====================================================
+# AUTH TOKEN LIFECYCLE
+# =====================================================
+# Tokens this close to their JWT exp are treated as expired (blocking login)
+TOKEN_EXPIRY_SKEW_SECONDS = int(os.getenv("PHOTON_TOKEN_EXPIRY_SKEW", "30"))
+# A background refresh starts this long before exp, if the token is in use
+TOKEN_REFRESH_AHEAD_SECONDS = int(os.getenv("PHOTON_TOKEN_REFRESH_AHEAD", "300"))
+
+# =====================================================
+# API LOGGING
+# =====================================================
+# INFO logs one line per API call; DEBUG adds (truncated) payloads and bodies
+API_LOG_LEVEL = os.getenv("PHOTON_API_LOG_LEVEL", "INFO").upper()
+# Fraction of calls logged per endpoint path; unlisted endpoints use "default"
+API_LOG_SAMPLE_RATES = {
+    "default": 1.0,
+    "/api/Business/PrintLabel": 0.1,
+    "/api/Common/AddressList": 0.2,
+    **json.loads(os.getenv("PHOTON_API_LOG_SAMPLE_RATES", "{}")),
+}
+# Logged bodies are cut to this many characters; long strings inside them
+# (base64 labels) are replaced by a length marker
+API_LOG_MAX_BODY_CHARS = int(os.getenv("PHOTON_API_LOG_MAX_BODY_CHARS", "2000"))
+API_LOG_MAX_STRING_CHARS = int(os.getenv("PHOTON_API_LOG_MAX_STRING_CHARS", "200"))
+API_LOG_MAX_LIST_ITEMS = int(os.getenv("PHOTON_API_LOG_MAX_LIST_ITEMS", "5"))
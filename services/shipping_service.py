@@ -1,64 +1,100 @@
-import requests
+import asyncio
 import json
-from services.auth_service import get_headers, login, get_logged_user_id
-
-BASE_URL = "https://qaapi.shipphoton.com"
-DEBUG = True  # Turn OFF in production
-
-#debug logger
-def debug_log(title, data=None):
-    if DEBUG:
-        print(f"\n========== {title} ==========")
-        if data is not None:
-            try:
-                print(json.dumps(data, indent=2))
-            except:
-                print(data)
-        print("================================\n")
+import logging
+import time
+import httpx
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+from services import http_client
+from services.http_client import run_sync
+from services.service_config import BASE_URL, RECENT_SHIPMENTS_CONCURRENCY
+from services.api_logging import log_event, should_sample
+from services.pincode_cache import get_pincode_cache
+from services.address_directory import address_directory, SHIP_FROM, SHIP_TO
+from services.quote_cache import quote_cache, quote_key
+from core.cache import MISSING
+from services.auth_service import async_get_headers, async_refresh_token, async_get_logged_user_id
+
+def _response_body(response):
+    """Body for the log listener: parsed JSON if possible, else raw text."""
+    def body():
+        try:
+            return response.json()
+        except ValueError:
+            return response.text
+    return body
 
 
 #safe request with auto token refresh
-def safe_request(method, url, **kwargs):
+async def async_safe_request(method, url, **kwargs):
+    endpoint = urlsplit(url).path
+    sampled = should_sample(endpoint)
+    started = time.perf_counter()
     try:
-        debug_log("API REQUEST", {
-            "method": method,
-            "url": url,
-            "payload": kwargs.get("json"),
-            "params": kwargs.get("params")
-        })
+        if sampled:
+            log_event("api_request", {
+                "payload": kwargs.get("json"),
+                "params": kwargs.get("params")
+            }, method=method, endpoint=endpoint)
 
-        response = requests.request(method, url, timeout=30, **kwargs)
+        response = await http_client.request(method, url, **kwargs)
 
         if response.status_code == 401:
-            debug_log("TOKEN EXPIRED - REFRESHING")
-            login()
-            response = requests.request(method, url, timeout=30, **kwargs)
-
-        debug_log("API RESPONSE STATUS", response.status_code)
-
-        try:
-            debug_log("API RESPONSE BODY", response.json())
-        except:
-            debug_log("API RESPONSE TEXT", response.text)
+            log_event("api_token_expired", level=logging.INFO, method=method, endpoint=endpoint)
+            rejected = kwargs.get("headers", {}).get("Authorization", "").removeprefix("Bearer ")
+            await async_refresh_token(rejected or None)
+            # retry with the fresh token, not the one that was just rejected
+            if "headers" in kwargs:
+                kwargs["headers"] = {**kwargs["headers"], **(await async_get_headers())}
+            response = await http_client.request(method, url, **kwargs)
+
+        if sampled:
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+            log_event("api_call", level=logging.INFO, method=method, endpoint=endpoint,
+                      status=response.status_code, elapsed_ms=elapsed_ms)
+            log_event("api_response", _response_body(response), method=method,
+                      endpoint=endpoint, status=response.status_code)
 
         return response
 
-    except requests.exceptions.RequestException as e:
-        debug_log("NETWORK ERROR", str(e))
+    except httpx.HTTPError as e:
+        # errors are always logged, regardless of sampling
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        log_event("api_network_error", level=logging.WARNING, method=method,
+                  endpoint=endpoint, elapsed_ms=elapsed_ms, error=str(e))
         return {
             "statusCode":500,
             "error":str(e)
         }
 
 
-#get pincode details
-def get_pincode_details(pincode, country="IN"):
+def safe_request(method, url, **kwargs):
+    return run_sync(async_safe_request(method, url, **kwargs))
+
+
+# Statuses meaning "this pincode is invalid", safe to negative-cache
+PINCODE_REJECTED_STATUSES = {400, 404, 422}
+
+
+#get pincode details (cached, see services/pincode_cache.py)
+async def async_get_pincode_details(pincode, country="IN"):
+    cache = get_pincode_cache()
+    cached = cache.get(pincode, country)
+    if cached is not MISSING:
+        return cached
+
     url = f"{BASE_URL}/api/Common/GetPincodeDetails"
     params = {"pincode": str(pincode), "country": str(country)}
 
-    response = safe_request("GET", url, params=params, headers=get_headers())
+    response = await async_safe_request("GET", url, params=params, headers=await async_get_headers())
 
-    if isinstance(response, dict) or response.status_code != 200:
+    if isinstance(response, dict):
+        return None
+
+    if response.status_code != 200:
+        # only a rejected pincode is remembered; 401/408/429 and 5xx are transient
+        if response.status_code in PINCODE_REJECTED_STATUSES:
+            cache.put(pincode, country, None)
         return None
 
     try:
@@ -74,22 +110,39 @@ def get_pincode_details(pincode, country="IN"):
             "country": str(country)
         }
 
-        debug_log("PINCODE DETAILS RESULT", result)
+        cache.put(pincode, country, result)
+
+        log_event("pincode_details", result, pincode=str(pincode))
         return result
 
     except Exception as e:
-        debug_log("PINCODE PARSE ERROR", str(e))
+        log_event("pincode_parse_error", level=logging.WARNING, pincode=str(pincode), error=str(e))
         return None
 
 
-#get quote API
-def get_quote(from_pincode, to_pincode, weight, length, width, height,
-              from_address=None, to_address=None):
+def get_pincode_details(pincode, country="IN"):
+    return run_sync(async_get_pincode_details(pincode, country))
+
+
+#get quote API (cached + singleflight, see services/quote_cache.py)
+async def async_get_quote(from_pincode, to_pincode, weight, length, width, height,
+                          from_address=None, to_address=None):
     """
     from_address / to_address: optional warehouse/shipto dicts with
     city, state, country, postalCode fields. When provided, city/state/country
     are taken directly from them instead of calling get_pincode_details.
     """
+    key = quote_key(from_pincode, to_pincode, weight, length, width, height)
+
+    return await quote_cache.get_or_fetch(
+        key,
+        lambda: _fetch_quote(from_pincode, to_pincode, weight, length, width, height,
+                             from_address, to_address),
+    )
+
+
+async def _fetch_quote(from_pincode, to_pincode, weight, length, width, height,
+                       from_address=None, to_address=None):
 
     # Build from_details
     if from_address:
@@ -99,7 +152,7 @@ def get_quote(from_pincode, to_pincode, weight, length, width, height,
             "country": from_address.get("country") or "IN"
         }
     else:
-        from_details = get_pincode_details(from_pincode)
+        from_details = await async_get_pincode_details(from_pincode)
 
     # Build to_details
     if to_address:
@@ -109,7 +162,7 @@ def get_quote(from_pincode, to_pincode, weight, length, width, height,
             "country": to_address.get("country") or "IN"
         }
     else:
-        to_details = get_pincode_details(to_pincode)
+        to_details = await async_get_pincode_details(to_pincode)
 
     if not from_details or not to_details:
         return {
@@ -136,7 +189,7 @@ def get_quote(from_pincode, to_pincode, weight, length, width, height,
         "weightUom": "KG",
     }
 
-    response = safe_request("POST", url, json=payload, headers=get_headers())
+    response = await async_safe_request("POST", url, json=payload, headers=await async_get_headers())
 
     if isinstance(response, dict):
         return {"statusCode": 500, "error": response["error"]}
@@ -151,12 +204,24 @@ def get_quote(from_pincode, to_pincode, weight, length, width, height,
     return quote_data
 
 
-#GET ALL ACTIVE SHIPFROM WAREHOUSES
-def get_all_warehouses():
+def get_quote(from_pincode, to_pincode, weight, length, width, height,
+              from_address=None, to_address=None):
+    return run_sync(async_get_quote(from_pincode, to_pincode, weight, length, width, height,
+                                    from_address, to_address))
+
+
+#GET ALL ACTIVE SHIPFROM WAREHOUSES (cached per user, see services/address_directory.py)
+async def async_get_all_warehouses(force_refresh=False):
+    user_id = await async_get_logged_user_id()
+
+    cached = address_directory.get(SHIP_FROM, user_id)
+    if cached is not None and not force_refresh:
+        return list(cached.addresses)
+
     url = f"{BASE_URL}/api/Common/AddressList"
     params = {"AddressType": "ShipFrom"}
 
-    response = safe_request("GET", url, params=params, headers=get_headers())
+    response = await async_safe_request("GET", url, params=params, headers=await async_get_headers())
 
     if isinstance(response, dict) or response.status_code != 200:
         return []
@@ -169,22 +234,33 @@ def get_all_warehouses():
         and str(w.get("addressType", "")).lower() == "shipfrom"
     ]
 
-    debug_log("ALL ACTIVE WAREHOUSES", active)
-    return active
+    address_directory.put(SHIP_FROM, user_id, active)
 
+    log_event("warehouses_loaded", user_id=user_id, count=len(active))
+    return list(active)
+
+
+def get_all_warehouses(force_refresh=False):
+    return run_sync(async_get_all_warehouses(force_refresh))
+
+
+#GET ALL ACTIVE SHIPTO ADDRESSES FOR LOGGED IN USER (cached per user)
+async def async_get_all_shipto_addresses(force_refresh=False):
+    user_id = await async_get_logged_user_id()
+
+    cached = address_directory.get(SHIP_TO, user_id)
+    if cached is not None and not force_refresh:
+        return list(cached.addresses)
 
-#GET ALL ACTIVE SHIPTO ADDRESSES FOR LOGGED IN USER
-def get_all_shipto_addresses():
     url = f"{BASE_URL}/api/Common/AddressList"
     params = {"AddressType": "ShipTo"}
 
-    response = safe_request("GET", url, params=params, headers=get_headers())
+    response = await async_safe_request("GET", url, params=params, headers=await async_get_headers())
 
     if isinstance(response, dict) or response.status_code != 200:
         return []
 
     data = response.json().get("data", [])
-    user_id = get_logged_user_id()
 
     active = [
         a for a in data
@@ -193,16 +269,38 @@ def get_all_shipto_addresses():
         and a.get("createdBy") == user_id
     ]
 
-    debug_log("USER SHIPTO ADDRESSES", active)
-    debug_log("LOGGED USER ID", get_logged_user_id())
-    return active
+    address_directory.put(SHIP_TO, user_id, active)
+
+    log_event("shipto_loaded", user_id=user_id, count=len(active))
+    return list(active)
+
+
+def get_all_shipto_addresses(force_refresh=False):
+    return run_sync(async_get_all_shipto_addresses(force_refresh))
+
+
+#O(1) LOOKUP IN THE CACHED ADDRESS LISTS (fetches once if not cached)
+async def async_find_address(address_type, address_id=None, postal_code=None, city=None):
+    user_id = await async_get_logged_user_id()
+
+    if address_directory.get(address_type, user_id) is None:
+        if address_type == SHIP_FROM:
+            await async_get_all_warehouses()
+        else:
+            await async_get_all_shipto_addresses()
+
+    return address_directory.find(address_type, user_id, address_id, postal_code, city)
+
+
+def find_address(address_type, address_id=None, postal_code=None, city=None):
+    return run_sync(async_find_address(address_type, address_id, postal_code, city))
 
 # CREATE NEW SHIPTO ADDRESS
-def save_new_shipto_address(state):
+async def async_save_new_shipto_address(state):
 
     url = f"{BASE_URL}/api/Common/SaveAddress"
 
-    user_id = get_logged_user_id()
+    user_id = await async_get_logged_user_id()
 
     payload = {
         "addressId": 0,
@@ -224,9 +322,7 @@ def save_new_shipto_address(state):
         "oneTimeLocation": False
     }
 
-    debug_log("SAVE ADDRESS PAYLOAD", payload)
-
-    response = safe_request("POST", url, json=payload, headers=get_headers())
+    response = await async_safe_request("POST", url, json=payload, headers=await async_get_headers())
 
     if isinstance(response, dict):
         return {"statusCode": 500, "error": response["error"]}
@@ -234,11 +330,28 @@ def save_new_shipto_address(state):
     if response.status_code != 200:
         return {"statusCode": response.status_code, "error": response.text}
 
-    return response.json()
+    result = response.json()
+
+    if result.get("statusCode") == 200:
+        address_directory.invalidate(SHIP_TO, user_id)
+
+        # the saved address, usable as a ShipTo without re-downloading the list
+        saved = {**payload}
+        data = result.get("data")
+        address_id = data.get("addressId") if isinstance(data, dict) else data
+        if isinstance(address_id, int) and address_id > 0:
+            saved["addressId"] = address_id
+        result["saved_address"] = saved
+
+    return result
+
+
+def save_new_shipto_address(state):
+    return run_sync(async_save_new_shipto_address(state))
 
 #default warehouse selection logic
-def get_default_warehouse():
-    warehouses = get_all_warehouses()
+async def async_get_default_warehouse():
+    warehouses = await async_get_all_warehouses()
 
     if not warehouses:
         return None
@@ -250,8 +363,12 @@ def get_default_warehouse():
     return warehouses[0]
 
 
+def get_default_warehouse():
+    return run_sync(async_get_default_warehouse())
+
+
 #create shipment
-def create_shipment(state):
+async def async_create_shipment(state):
 
     warehouse = state.get("warehouse")
     shipto = state.get("shipto")
@@ -319,9 +436,7 @@ def create_shipment(state):
     }
     final_payload = payload
 
-    debug_log("QUICKSHIP PAYLOAD", final_payload)
-
-    response = safe_request("POST", url, json=final_payload, headers=get_headers())
+    response = await async_safe_request("POST", url, json=final_payload, headers=await async_get_headers())
 
     if isinstance(response, dict):
         return {"statusCode": 500, "error": response["error"]}
@@ -332,8 +447,12 @@ def create_shipment(state):
     return response.json()
 
 
+def create_shipment(state):
+    return run_sync(async_create_shipment(state))
+
+
 #Tracking API
-def get_tracking(tracking_number):
+async def async_get_tracking(tracking_number):
 
     url = f"{BASE_URL}/api/Business/ShipmentTracking"
     payload = {
@@ -343,7 +462,7 @@ def get_tracking(tracking_number):
         "carrierId": ""
     }
 
-    response = safe_request("POST", url, json=payload, headers=get_headers())
+    response = await async_safe_request("POST", url, json=payload, headers=await async_get_headers())
 
     if isinstance(response, dict):
         return {"statusCode": 500, "error": response["error"]}
@@ -353,7 +472,11 @@ def get_tracking(tracking_number):
 
     return response.json()
 
-def get_recent_shipments(date):
+
+def get_tracking(tracking_number):
+    return run_sync(async_get_tracking(tracking_number))
+
+async def async_get_recent_shipments(date):
     url = f"{BASE_URL}/api/Business/ShipmentTracking"
 
     payload = {
@@ -362,7 +485,7 @@ def get_recent_shipments(date):
         "trackingNumber": ""
     }
 
-    response = safe_request("POST", url, json=payload, headers=get_headers())
+    response = await async_safe_request("POST", url, json=payload, headers=await async_get_headers())
 
     if isinstance(response, dict):
         return {"statusCode": 500, "error": response["error"]}
@@ -372,8 +495,53 @@ def get_recent_shipments(date):
 
     return response.json()
 
+
+def get_recent_shipments(date):
+    return run_sync(async_get_recent_shipments(date))
+
+
+# SHIPMENTS IN DATE RANGE (concurrent per-day requests)
+async def async_get_shipments_in_range(days, limit=None, end_date=None,
+                                       concurrency=RECENT_SHIPMENTS_CONCURRENCY):
+    """
+    Shipments of the last `days` days, newest day first.
+    Per-day requests run concurrently (at most `concurrency` in flight) and
+    are merged in date order. With a limit, returns as soon as the newest
+    days already hold that many shipments and cancels the rest.
+    """
+    end = end_date or datetime.now()
+    dates = [(end - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(date):
+        async with semaphore:
+            return await async_get_recent_shipments(date)
+
+    # created newest first, so the newest days also get the first slots
+    tasks = [asyncio.create_task(fetch(date)) for date in dates]
+    shipments = []
+
+    try:
+        for task in tasks:
+            recent = await task
+            if recent.get("statusCode") == 200 and recent.get("data"):
+                shipments.extend(recent.get("data"))
+            if limit and len(shipments) >= limit:
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    return shipments[:limit] if limit else shipments
+
+
+def get_shipments_in_range(days, limit=None, end_date=None,
+                           concurrency=RECENT_SHIPMENTS_CONCURRENCY):
+    return run_sync(async_get_shipments_in_range(days, limit, end_date, concurrency))
+
 # PRINT LABEL API
-def print_label(tracking_number, box_no=None, date=None):
+async def async_print_label(tracking_number, box_no=None, date=None):
 
     url = f"{BASE_URL}/api/Business/PrintLabel"
 
@@ -387,7 +555,7 @@ def print_label(tracking_number, box_no=None, date=None):
     if date:
         params["date"] = date
 
-    response = safe_request("GET", url, params=params, headers=get_headers())
+    response = await async_safe_request("GET", url, params=params, headers=await async_get_headers())
 
     if isinstance(response, dict):
         return {"statusCode": 500, "error": response["error"]}
@@ -395,4 +563,8 @@ def print_label(tracking_number, box_no=None, date=None):
     if response.status_code != 200:
         return {"statusCode": response.status_code, "error": response.text}
 
-    return response.json()
\ No newline at end of file
+    return response.json()
+
+
+def print_label(tracking_number, box_no=None, date=None):
+    return run_sync(async_print_label(tracking_number, box_no, date))
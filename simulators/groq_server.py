@@ -0,0 +1,267 @@
+"""
+Groq Stand-in Server
+Local OpenAI/Groq-compatible chat-completions endpoint with deterministic
+canned answers and simulated latency, so the orchestrator can be
+benchmarked and load-tested without the network.
+
+- Messages with shipping details and tools attached get a get_quote tool
+  call with the fields found in the message. A 10-20 digit number gets a
+  get_tracking call.
+- Prompts carrying a knowledge-base context get a short HTML answer built
+  from the first document in the context.
+- Anything else gets a fixed assistant reply.
+
+Latency: GROQ_SIM_TTFT_MS (+ jitter, + prompt size) before the first token,
+then GROQ_SIM_TOKENS_PER_SECOND for the rest, streamed or not.
+
+Run it, then point the app at it:
+    python -m simulators.groq_server
+    GROQ_BASE_URL=http://127.0.0.1:8100 GROQ_API_KEY=sim uvicorn main:app
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from retrieval.context_packer import estimate_tokens
+from simulators.sim_config import (
+    GROQ_SIM_HOST,
+    GROQ_SIM_PORT,
+    GROQ_SIM_TTFT_MS,
+    GROQ_SIM_JITTER_MS,
+    GROQ_SIM_TOKENS_PER_SECOND,
+    GROQ_SIM_PROMPT_MS_PER_1K,
+    GROQ_SIM_SEED,
+)
+
+app = FastAPI(title="Groq stand-in")
+
+_rng = random.Random(GROQ_SIM_SEED)
+_stats = {"requests": 0, "streamed": 0, "tool_calls": 0}
+
+_PINCODE_RE = re.compile(r"\b\d{6}\b")
+_WEIGHT_RE = re.compile(r"(\d+(?:\.\d+)?)\s*kg")
+_DIM_RE = re.compile(r"(\d+(?:\.\d+)?)\s*[x×*]\s*(\d+(?:\.\d+)?)\s*[x×*]\s*(\d+(?:\.\d+)?)")
+_TRACKING_NO_RE = re.compile(r"\b\d{10,20}\b")
+_DOCUMENT_RE = re.compile(r"=== DOCUMENT: (.+?) \(Relevance: [^)]*\) ===\n(.*?)(?=\n=== DOCUMENT:|\Z)", re.S)
+_TOKEN_RE = re.compile(r"\S+\s*|\s+")
+
+GREETINGS = {"hi", "hello", "hey"}
+DEFAULT_REPLY = (
+    "I can help you with shipping quotes, creating shipments, and shipment tracking. "
+    "What would you like to do?"
+)
+
+
+# =====================================================
+# CANNED COMPLETIONS
+# =====================================================
+
+def _text(message: dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):  # OpenAI content parts
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+def _tool_call(user_text: str, tool_names: set) -> dict | None:
+    msg = user_text.lower()
+
+    tracking = _TRACKING_NO_RE.search(msg)
+    if tracking and "get_tracking" in tool_names:
+        return {"name": "get_tracking", "arguments": {"tracking_number": tracking.group()}}
+
+    if "get_quote" not in tool_names:
+        return None
+    args = {}
+    pincodes = _PINCODE_RE.findall(msg)
+    if pincodes:
+        args["from_pincode"] = pincodes[0]
+    if len(pincodes) > 1:
+        args["to_pincode"] = pincodes[1]
+    weight = _WEIGHT_RE.search(msg)
+    if weight:
+        args["weight"] = float(weight.group(1))
+    dims = _DIM_RE.search(msg)
+    if dims:
+        args.update(zip(("length", "width", "height"), map(float, dims.groups())))
+    return {"name": "get_quote", "arguments": args} if args else None
+
+
+def _kb_answer(system_prompt: str) -> str | None:
+    if "KNOWLEDGE BASE CONTEXT" not in system_prompt:
+        return None
+    document = _DOCUMENT_RE.search(system_prompt)
+    if document is None:
+        return None
+    title, body = document.group(1), " ".join(document.group(2).split())
+    overview = body[:240].rsplit(" ", 1)[0] if len(body) > 240 else body
+    return (
+        f'<div style="background:linear-gradient(135deg,#1a3a4a,#2f6f6f);color:#fff;'
+        f'padding:14px 18px;border-radius:10px 10px 0 0"><b>{title}</b></div>'
+        f'<div style="background:#f0fafa;padding:12px 16px;border-radius:0 0 10px 10px;'
+        f'border:1px solid #d0e8e8;border-top:0">{overview}</div>'
+    )
+
+
+def complete(messages: list[dict], tools: list[dict] | None) -> dict:
+    """Deterministic completion: {"content": str | None, "tool_call": dict | None}."""
+    system_prompt = "\n".join(_text(m) for m in messages if m.get("role") == "system")
+    user_text = next((_text(m) for m in reversed(messages) if m.get("role") == "user"), "")
+
+    if tools:
+        names = {t.get("function", {}).get("name") for t in tools}
+        call = _tool_call(user_text, names)
+        if call is not None:
+            return {"content": None, "tool_call": call}
+
+    if user_text.lower().strip() in GREETINGS:
+        return {"content": "Hi! " + DEFAULT_REPLY, "tool_call": None}
+    return {"content": _kb_answer(system_prompt) or DEFAULT_REPLY, "tool_call": None}
+
+
+# =====================================================
+# LATENCY
+# =====================================================
+
+def _first_token_delay(prompt_tokens: int) -> float:
+    jitter = _rng.uniform(-GROQ_SIM_JITTER_MS, GROQ_SIM_JITTER_MS) if GROQ_SIM_JITTER_MS else 0.0
+    ms = GROQ_SIM_TTFT_MS + jitter + GROQ_SIM_PROMPT_MS_PER_1K * prompt_tokens / 1000
+    return max(0.0, ms) / 1000
+
+
+def _token_delay() -> float:
+    return 1 / GROQ_SIM_TOKENS_PER_SECOND if GROQ_SIM_TOKENS_PER_SECOND > 0 else 0.0
+
+
+# =====================================================
+# RESPONSES
+# =====================================================
+
+def _completion_id(messages) -> str:
+    digest = hashlib.sha1(json.dumps(messages, sort_keys=True, default=str).encode()).hexdigest()
+    return f"chatcmpl-sim-{digest[:16]}"
+
+
+def _usage(prompt_tokens: int, completion_tokens: int) -> dict:
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def _tool_call_payload(call: dict, completion_id: str) -> dict:
+    return {
+        "id": f"call_{completion_id[-8:]}",
+        "type": "function",
+        "function": {"name": call["name"], "arguments": json.dumps(call["arguments"])},
+    }
+
+
+async def _stream(result, completion_id, model, prompt_tokens, completion_tokens, delay):
+    created = int(time.time())
+
+    def chunk(delta, finish_reason=None, **extra):
+        payload = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            **extra,
+        }
+        return f"data: {json.dumps(payload)}\n\n"
+
+    await asyncio.sleep(delay)
+    yield chunk({"role": "assistant", "content": ""})
+
+    if result["tool_call"] is not None:
+        call = _tool_call_payload(result["tool_call"], completion_id)
+        yield chunk({"tool_calls": [{"index": 0, **call}]})
+        finish_reason = "tool_calls"
+    else:
+        step = _token_delay()
+        for token in _TOKEN_RE.findall(result["content"]):
+            if step:
+                await asyncio.sleep(step)
+            yield chunk({"content": token})
+        finish_reason = "stop"
+
+    # Groq reports usage on the last chunk under x_groq
+    yield chunk({}, finish_reason, x_groq={
+        "id": completion_id, "usage": _usage(prompt_tokens, completion_tokens),
+    })
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/openai/v1/chat/completions")
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    messages = body.get("messages") or []
+    if not messages:
+        return JSONResponse(
+            status_code=400,
+            content={"error": {"message": "messages is required", "type": "invalid_request_error"}},
+        )
+
+    model = body.get("model", "llama-3.1-8b-instant")
+    result = complete(messages, body.get("tools"))
+    completion_id = _completion_id(messages)
+
+    prompt_tokens = sum(estimate_tokens(_text(m)) for m in messages)
+    if body.get("tools"):
+        prompt_tokens += estimate_tokens(json.dumps(body["tools"]))
+    if result["tool_call"] is not None:
+        completion_tokens = estimate_tokens(json.dumps(result["tool_call"]["arguments"])) + 8
+    else:
+        completion_tokens = len(_TOKEN_RE.findall(result["content"]))
+
+    _stats["requests"] += 1
+    if result["tool_call"] is not None:
+        _stats["tool_calls"] += 1
+    delay = _first_token_delay(prompt_tokens)
+
+    if body.get("stream"):
+        _stats["streamed"] += 1
+        return StreamingResponse(
+            _stream(result, completion_id, model, prompt_tokens, completion_tokens, delay),
+            media_type="text/event-stream",
+        )
+
+    await asyncio.sleep(delay + completion_tokens * _token_delay())
+    message = {"role": "assistant", "content": result["content"]}
+    if result["tool_call"] is not None:
+        message["tool_calls"] = [_tool_call_payload(result["tool_call"], completion_id)]
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": message,
+            "finish_reason": "tool_calls" if result["tool_call"] is not None else "stop",
+        }],
+        "usage": _usage(prompt_tokens, completion_tokens),
+    }
+
+
+@app.get("/openai/v1/models")
+@app.get("/v1/models")
+async def list_models():
+    return {"object": "list", "data": [{"id": "llama-3.1-8b-instant", "object": "model"}]}
+
+
+@app.get("/sim/stats")
+async def sim_stats():
+    return dict(_stats)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host=GROQ_SIM_HOST, port=GROQ_SIM_PORT)
@@ -0,0 +1,445 @@
+"""
+Photon API Stand-in Server
+Local implementation of the Photon endpoints the chatbot calls, serving
+synthetic but shape-accurate data, for measuring end-to-end chat latency
+without the QA API.
+
+- Auth: GetToken issues unsigned JWTs (userId, name, exp) that expire after
+  PHOTON_SIM_TOKEN_TTL; expired or unknown tokens get a 401, and
+  PHOTON_SIM_EXPIRE_RATE answers a fraction of calls 401 anyway.
+  POST /sim/expire-tokens revokes every issued token.
+- Latency: per-endpoint fixed / uniform / lognormal profiles
+  (PHOTON_SIM_LATENCY), applied before the response.
+- Errors: per-endpoint 500 rates (PHOTON_SIM_ERROR_RATES).
+- Data: pincodes resolve through a small city table, quotes are priced
+  from distance and chargeable weight, and every day has a few
+  deterministic shipments (tracking number 7YYYYMMDDNNN) next to the ones
+  created through QuickShip.
+
+Run it, then point the app at it:
+    python -m simulators.photon_server
+    PHOTON_BASE_URL=http://127.0.0.1:8200 uvicorn main:app
+"""
+import asyncio
+import base64
+import hashlib
+import itertools
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from simulators.sim_config import (
+    PHOTON_SIM_HOST,
+    PHOTON_SIM_PORT,
+    PHOTON_SIM_LATENCY,
+    PHOTON_SIM_ERROR_RATES,
+    PHOTON_SIM_TOKEN_TTL_SECONDS,
+    PHOTON_SIM_EXPIRE_RATE,
+    PHOTON_SIM_SEED,
+)
+
+app = FastAPI(title="Photon API stand-in")
+
+SIM_USER_ID = 101
+SIM_USER_NAME = "Sim User"
+
+_rng = random.Random(PHOTON_SIM_SEED)
+_lock = threading.Lock()
+_tokens: dict[str, float] = {}     # jti -> exp
+_stats = {"requests": Counter(), "errors": Counter(), "unauthorized": Counter()}
+
+
+# =====================================================
+# LATENCY / ERRORS / AUTH
+# =====================================================
+
+def sample_latency(profile: dict, rng: random.Random = _rng) -> float:
+    """One delay in seconds from a latency profile (see sim_config)."""
+    dist = profile.get("dist", "fixed")
+    if dist == "uniform":
+        ms = rng.uniform(profile["min_ms"], profile["max_ms"])
+    elif dist == "lognormal":
+        median = profile["median_ms"]
+        # p95 of a lognormal is median * exp(1.645 sigma)
+        sigma = math.log(profile["p95_ms"] / median) / 1.645 if profile["p95_ms"] > median else 0.0
+        ms = rng.lognormvariate(math.log(median), sigma)
+    else:
+        ms = profile.get("ms", 0)
+    return max(0.0, ms) / 1000
+
+
+def _b64url(data: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b"=").decode()
+
+
+def issue_token() -> str:
+    now = time.time()
+    jti = uuid.uuid4().hex
+    exp = now + PHOTON_SIM_TOKEN_TTL_SECONDS
+    with _lock:
+        _tokens[jti] = exp
+    header = _b64url({"alg": "none", "typ": "JWT"})
+    payload = _b64url({
+        "userId": SIM_USER_ID, "name": SIM_USER_NAME,
+        "iat": int(now), "exp": int(exp), "jti": jti,
+    })
+    return f"{header}.{payload}.sim"
+
+
+def _token_valid(authorization: str) -> bool:
+    token = authorization.removeprefix("Bearer ").strip()
+    try:
+        part = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(part + "=" * (-len(part) % 4)))
+    except (IndexError, ValueError):
+        return False
+    with _lock:
+        exp = _tokens.get(claims.get("jti"))
+    return exp is not None and exp > time.time()
+
+
+def _error(status: int, message: str) -> JSONResponse:
+    return JSONResponse(status_code=status, content={"statusCode": status, "message": message, "data": None})
+
+
+def _ok(data, message: str = "Success") -> dict:
+    return {"statusCode": 200, "message": message, "data": data}
+
+
+@app.middleware("http")
+async def simulate_conditions(request: Request, call_next):
+    path = request.url.path
+    if not path.startswith("/api/"):
+        return await call_next(request)
+
+    _stats["requests"][path] += 1
+    await asyncio.sleep(sample_latency(PHOTON_SIM_LATENCY.get(path, PHOTON_SIM_LATENCY["default"])))
+
+    if _rng.random() < PHOTON_SIM_ERROR_RATES.get(path, PHOTON_SIM_ERROR_RATES["default"]):
+        _stats["errors"][path] += 1
+        return _error(500, "Simulated server error")
+
+    if path != "/api/Auth/GetToken":
+        if (not _token_valid(request.headers.get("Authorization", ""))
+                or _rng.random() < PHOTON_SIM_EXPIRE_RATE):
+            _stats["unauthorized"][path] += 1
+            return _error(401, "Token expired")
+
+    return await call_next(request)
+
+
+# =====================================================
+# SYNTHETIC DATA
+# =====================================================
+
+# pincode prefix -> (city, state code, state name)
+PINCODE_CITIES = {
+    "11": ("New Delhi", "DL", "Delhi"),
+    "12": ("Gurugram", "HR", "Haryana"),
+    "22": ("Lucknow", "UP", "Uttar Pradesh"),
+    "30": ("Jaipur", "RJ", "Rajasthan"),
+    "38": ("Ahmedabad", "GJ", "Gujarat"),
+    "40": ("Mumbai", "MH", "Maharashtra"),
+    "41": ("Pune", "MH", "Maharashtra"),
+    "50": ("Hyderabad", "TG", "Telangana"),
+    "56": ("Bengaluru", "KA", "Karnataka"),
+    "60": ("Chennai", "TN", "Tamil Nadu"),
+    "70": ("Kolkata", "WB", "West Bengal"),
+}
+
+# (carrierCode, serviceCode, serviceDescription, carrierType, base, per kg, transit days)
+CARRIER_SERVICES = [
+    ("DTDC", "DTDC_SFC", "DTDC Surface", "Surface", 45.0, 18.0, 5),
+    ("DELHIVERY", "DLV_EXP", "Delhivery Express", "Air", 70.0, 32.0, 2),
+    ("BLUEDART", "BD_APEX", "Blue Dart Apex", "Air", 95.0, 41.0, 1),
+    ("XPRESSBEES", "XB_STD", "Xpressbees Standard", "Surface", 40.0, 16.5, 6),
+]
+
+_SHIP_FROM = [
+    {"addressId": 1, "addressName": "Main Warehouse", "name": "Sim Logistics Pvt Ltd",
+     "address1": "Plot 12, MIDC Andheri East", "postalCode": "400093", "city": "Mumbai",
+     "state": "MH", "priority": True},
+    {"addressId": 2, "addressName": "North Hub", "name": "Sim Logistics Pvt Ltd",
+     "address1": "Sector 18, Udyog Vihar", "postalCode": "122015", "city": "Gurugram",
+     "state": "HR", "priority": False},
+]
+_SHIP_TO = [
+    {"addressId": 11, "addressName": "Acme Retail", "name": "Acme Retail",
+     "address1": "MG Road", "postalCode": "560001", "city": "Bengaluru", "state": "KA"},
+    {"addressId": 12, "addressName": "Zenith Stores", "name": "Zenith Stores",
+     "address1": "Park Street", "postalCode": "700016", "city": "Kolkata", "state": "WB"},
+    {"addressId": 13, "addressName": "Orbit Traders", "name": "Orbit Traders",
+     "address1": "Anna Salai", "postalCode": "600002", "city": "Chennai", "state": "TN"},
+]
+_addresses = (
+    [{**a, "addressType": "ShipFrom"} for a in _SHIP_FROM]
+    + [{**a, "addressType": "ShipTo"} for a in _SHIP_TO]
+)
+for _address in _addresses:
+    _address.update({
+        "address2": "", "address3": "", "country": "IN", "phone": "9800000000",
+        "emailId": "ops@example.com", "createdBy": SIM_USER_ID, "isActive": True,
+        "oneTimeLocation": False,
+    })
+    _address.setdefault("priority", False)
+_address_ids = itertools.count(100)
+
+_created: dict[str, dict] = {}     # QuickShip tracking number -> shipment
+_shipment_seq = itertools.count(1)
+
+# smallest valid one-page PDF, served as every label
+_LABEL_PDF = base64.b64encode(
+    b"%PDF-1.1\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+    b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+    b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 288 432]>>endobj\n"
+    b"trailer<</Root 1 0 R>>\n%%EOF\n"
+).decode()
+
+
+def resolve_pincode(pincode: str) -> tuple[str, str, str] | None:
+    if len(pincode) != 6 or not pincode.isdigit() or pincode[0] == "0":
+        return None
+    known = PINCODE_CITIES.get(pincode[:2])
+    if known:
+        return known
+    return (f"Town {pincode[:3]}", f"S{pincode[0]}", f"State {pincode[0]}")
+
+
+def _seeded(*parts) -> random.Random:
+    digest = hashlib.sha1("|".join(map(str, (PHOTON_SIM_SEED, *parts))).encode()).hexdigest()
+    return random.Random(int(digest[:16], 16))
+
+
+def _shipment(tracking: str, date: str, from_pin: str, to_pin: str, carrier: tuple,
+              weight: float, dims: tuple, boxes: int, status: str) -> dict:
+    city_from, _, state_from = resolve_pincode(from_pin)
+    city_to, _, state_to = resolve_pincode(to_pin)
+    return {
+        "trackingNumber": tracking,
+        "trackingNo": tracking,
+        "carrierId": carrier[0],
+        "carrierName": carrier[0],
+        "serviceName": carrier[2],
+        "shipDate": date,
+        "currentStatus": status,
+        "currentLocation": city_to if status == "Delivered" else city_from,
+        "lastChanges": f"{date} 18:30",
+        "cityFrom": city_from,
+        "shipFromStateName": state_from,
+        "shipFromCountryName": "India",
+        "shipToCityName": city_to,
+        "shipToStateName": state_to,
+        "shipToCountryName": "India",
+        "weight": str(weight),
+        "length": str(dims[0]),
+        "width": str(dims[1]),
+        "height": str(dims[2]),
+        "noOfPackages": boxes,
+    }
+
+
+def synthetic_tracking_number(date: str, n: int) -> str:
+    return f"7{date.replace('-', '')}{n:03d}"
+
+
+def _synthetic_shipment(date: str, n: int) -> dict:
+    rng = _seeded(date, n)
+    origin = rng.choice(_SHIP_FROM)
+    dest = rng.choice(_SHIP_TO)
+    age = (datetime.now() - datetime.strptime(date, "%Y-%m-%d")).days
+    status = "Delivered" if age > 3 else rng.choice(["Manifested", "In Transit", "Out for Delivery"])
+    return _shipment(
+        synthetic_tracking_number(date, n), date, origin["postalCode"], dest["postalCode"],
+        rng.choice(CARRIER_SERVICES), rng.choice([0.5, 1, 2, 2.5, 5]),
+        rng.choice([(10, 10, 10), (20, 15, 10), (30, 20, 15)]), rng.randint(1, 3), status,
+    )
+
+
+def shipments_on(date: str) -> list[dict]:
+    count = 2 + _seeded(date).randint(0, 3)
+    synthetic = [_synthetic_shipment(date, n) for n in range(1, count + 1)]
+    with _lock:
+        created = [s for s in _created.values() if s["shipDate"] == date]
+    return created + synthetic
+
+
+def find_shipment(tracking: str) -> dict | None:
+    with _lock:
+        if tracking in _created:
+            return _created[tracking]
+    if len(tracking) == 12 and tracking.startswith("7") and tracking.isdigit():
+        try:
+            date = datetime.strptime(tracking[1:9], "%Y%m%d").strftime("%Y-%m-%d")
+        except ValueError:
+            return None
+        n = int(tracking[9:])
+        if 1 <= n <= len(shipments_on(date)):
+            return _synthetic_shipment(date, n)
+    return None
+
+
+def price_services(from_pin: str, to_pin: str, weight: float, dims: tuple) -> list[dict]:
+    distance = abs(int(from_pin[:2]) - int(to_pin[:2]))
+    chargeable = max(weight, dims[0] * dims[1] * dims[2] / 5000)
+    today = datetime.now()
+    services = []
+    for code, service, description, kind, base, per_kg, days in CARRIER_SERVICES:
+        transit = days + distance // 25
+        services.append({
+            "carrierId": str(uuid.uuid5(uuid.NAMESPACE_DNS, f"{code}.carrier.sim")),
+            "serviceId": str(uuid.uuid5(uuid.NAMESPACE_DNS, f"{service}.service.sim")),
+            "carrierCode": code,
+            "serviceCode": service,
+            "serviceDescription": description,
+            "carrierType": kind,
+            "totalCharges": round((base + per_kg * chargeable) * (1 + distance / 60), 2),
+            "businessDaysInTransit": transit,
+            "arrivalDate": (today + timedelta(days=transit)).strftime("%Y-%m-%d"),
+        })
+    return services
+
+
+def _number(value, default=0.0) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+# =====================================================
+# ENDPOINTS
+# =====================================================
+
+@app.post("/api/Auth/GetToken")
+async def get_token(request: Request):
+    body = await request.json()
+    if not body.get("userId") or not body.get("password"):
+        return _error(400, "userId and password are required")
+    return _ok({"token": issue_token()})
+
+
+@app.get("/api/Admin/GetUsersById")
+async def get_user(UserId: int):
+    return _ok({"userId": UserId, "fullName": SIM_USER_NAME, "emailId": "sim.user@example.com"})
+
+
+@app.get("/api/Common/GetPincodeDetails")
+async def get_pincode_details(pincode: str, country: str = "IN"):
+    resolved = resolve_pincode(pincode)
+    if resolved is None:
+        return _error(400, "Invalid pincode")
+    city, state_code, _ = resolved
+    return _ok({"pincode": pincode, "cityName": city, "stateCode": state_code, "countryCode": country})
+
+
+@app.post("/api/Shipping/GetQuote")
+async def get_quote(request: Request):
+    body = await request.json()
+    from_pin = str(body.get("shipFromPinCode", ""))
+    to_pin = str(body.get("shipToPincode", ""))
+    if resolve_pincode(from_pin) is None or resolve_pincode(to_pin) is None:
+        return _error(400, "Invalid pincode")
+    weight = _number(body.get("weight"))
+    dims = tuple(_number(body.get(k)) for k in ("length", "width", "height"))
+    if weight <= 0:
+        return _error(400, "Weight must be greater than zero")
+    return _ok({"servicesOnDate": price_services(from_pin, to_pin, weight, dims)})
+
+
+@app.get("/api/Common/AddressList")
+async def address_list(AddressType: str = ""):
+    kind = AddressType.lower()
+    with _lock:
+        data = [dict(a) for a in _addresses if not kind or a["addressType"].lower() == kind]
+    return _ok(data)
+
+
+@app.post("/api/Common/SaveAddress")
+async def save_address(request: Request):
+    body = await request.json()
+    if not body.get("postalCode") or resolve_pincode(str(body["postalCode"])) is None:
+        return _error(400, "Invalid postal code")
+    address = {**body, "addressId": next(_address_ids), "isActive": True}
+    with _lock:
+        _addresses.append(address)
+    return _ok({"addressId": address["addressId"]}, "Address saved successfully")
+
+
+@app.post("/api/Shipping/QuickShip")
+async def quick_ship(request: Request):
+    body = await request.json()
+    from_pin = str(body.get("shipFromPincode", ""))
+    to_pin = str(body.get("shipToPincode", ""))
+    if resolve_pincode(from_pin) is None or resolve_pincode(to_pin) is None:
+        return _error(400, "Invalid pincode")
+    carrier = next((c for c in CARRIER_SERVICES if c[0] == body.get("carrierId")), None)
+    if carrier is None:
+        return _error(400, "Unknown carrier")
+
+    date = datetime.now().strftime("%Y-%m-%d")
+    tracking = f"8{date.replace('-', '')}{next(_shipment_seq):05d}"
+    shipment = _shipment(
+        tracking, date, from_pin, to_pin, carrier, _number(body.get("weight")),
+        tuple(_number(body.get(k)) for k in ("length", "width", "height")),
+        int(_number(body.get("noOfBoxes"), 1)), "Manifested",
+    )
+    with _lock:
+        _created[tracking] = shipment
+    return _ok({
+        "trackingNo": tracking,
+        "carrierName": carrier[0],
+        "carrierCode": carrier[0],
+        "serviceName": carrier[2],
+        "shipDate": date,
+    }, "Shipment created successfully")
+
+
+@app.post("/api/Business/ShipmentTracking")
+async def shipment_tracking(request: Request):
+    body = await request.json()
+    tracking = str(body.get("trackingNumber") or "").strip()
+    if tracking:
+        shipment = find_shipment(tracking)
+        return _ok([shipment] if shipment else [])
+    date = str(body.get("date") or "")
+    try:
+        datetime.strptime(date, "%Y-%m-%d")
+    except ValueError:
+        return _error(400, "trackingNumber or date is required")
+    return _ok(shipments_on(date))
+
+
+@app.get("/api/Business/PrintLabel")
+async def print_label(TrackingNo: str, BoxNo: str | None = None, date: str | None = None):
+    if find_shipment(TrackingNo) is None:
+        return _error(404, "Label not found")
+    return _ok({"fileName": f"label_{TrackingNo}.pdf", "fileData": _LABEL_PDF})
+
+
+# =====================================================
+# SIMULATOR CONTROL
+# =====================================================
+
+@app.post("/sim/expire-tokens")
+async def expire_tokens():
+    """Revoke every issued token; the next call of each client gets a 401."""
+    with _lock:
+        revoked = len(_tokens)
+        _tokens.clear()
+    return {"revoked": revoked}
+
+
+@app.get("/sim/stats")
+async def sim_stats():
+    return {name: dict(counts) for name, counts in _stats.items()}
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host=PHOTON_SIM_HOST, port=PHOTON_SIM_PORT)
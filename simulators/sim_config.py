@@ -0,0 +1,52 @@
+"""
+Simulator Configuration
+Settings for the local stand-in servers used for offline benchmarking.
+Every value can be overridden through an environment variable.
+"""
+import json
+import os
+
+# =====================================================
+# GROQ STAND-IN (simulators/groq_server.py)
+# =====================================================
+GROQ_SIM_HOST = os.getenv("GROQ_SIM_HOST", "127.0.0.1")
+GROQ_SIM_PORT = int(os.getenv("GROQ_SIM_PORT", "8100"))
+# Delay before the first token (queueing + prompt processing)
+GROQ_SIM_TTFT_MS = float(os.getenv("GROQ_SIM_TTFT_MS", "200"))
+# Uniform +/- jitter on the first-token delay, drawn from a seeded RNG
+GROQ_SIM_JITTER_MS = float(os.getenv("GROQ_SIM_JITTER_MS", "0"))
+# Generation speed; 0 returns the whole completion at once
+GROQ_SIM_TOKENS_PER_SECOND = float(os.getenv("GROQ_SIM_TOKENS_PER_SECOND", "500"))
+# Prompt processing cost added to the first-token delay, per 1000 prompt tokens
+GROQ_SIM_PROMPT_MS_PER_1K = float(os.getenv("GROQ_SIM_PROMPT_MS_PER_1K", "20"))
+GROQ_SIM_SEED = int(os.getenv("GROQ_SIM_SEED", "0"))
+
+# =====================================================
+# PHOTON API STAND-IN (simulators/photon_server.py)
+# =====================================================
+PHOTON_SIM_HOST = os.getenv("PHOTON_SIM_HOST", "127.0.0.1")
+PHOTON_SIM_PORT = int(os.getenv("PHOTON_SIM_PORT", "8200"))
+# Latency profile per endpoint path; unlisted endpoints use "default".
+#   {"dist": "fixed", "ms": 50}
+#   {"dist": "uniform", "min_ms": 20, "max_ms": 80}
+#   {"dist": "lognormal", "median_ms": 120, "p95_ms": 400}
+PHOTON_SIM_LATENCY = {
+    "default": {"dist": "lognormal", "median_ms": 80, "p95_ms": 250},
+    "/api/Auth/GetToken": {"dist": "lognormal", "median_ms": 150, "p95_ms": 400},
+    "/api/Shipping/GetQuote": {"dist": "lognormal", "median_ms": 700, "p95_ms": 2000},
+    "/api/Shipping/QuickShip": {"dist": "lognormal", "median_ms": 1200, "p95_ms": 3000},
+    "/api/Business/ShipmentTracking": {"dist": "lognormal", "median_ms": 250, "p95_ms": 800},
+    "/api/Business/PrintLabel": {"dist": "lognormal", "median_ms": 400, "p95_ms": 1200},
+    **json.loads(os.getenv("PHOTON_SIM_LATENCY", "{}")),
+}
+# Fraction of requests per endpoint path answered with a 500
+PHOTON_SIM_ERROR_RATES = {
+    "default": 0.0,
+    **json.loads(os.getenv("PHOTON_SIM_ERROR_RATES", "{}")),
+}
+# JWT lifetime of issued tokens; expired tokens get a 401
+PHOTON_SIM_TOKEN_TTL_SECONDS = int(os.getenv("PHOTON_SIM_TOKEN_TTL", "3600"))
+# Fraction of authenticated requests answered 401 as if the token had just
+# expired server-side (exercises the client's refresh-and-retry path)
+PHOTON_SIM_EXPIRE_RATE = float(os.getenv("PHOTON_SIM_EXPIRE_RATE", "0"))
+PHOTON_SIM_SEED = int(os.getenv("PHOTON_SIM_SEED", "0"))